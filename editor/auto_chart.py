@@ -0,0 +1,324 @@
+import cmath
+import json
+import math
+import multiprocessing
+import os
+import sys
+import wave
+from array import array
+from bisect import bisect_right
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from PySide6.QtCore import QCoreApplication, QEventLoop, QObject, QUrl, Signal
+from PySide6.QtMultimedia import QAudioDecoder, QAudioFormat
+
+from editor.waveform import SAMPLE_TYPES
+from game.chart import LANES
+from game.chart_format import write_chart
+from game.tempo import TempoMap
+
+# Analyse sur un signal mono sous-échantillonné : largement assez pour trouver les attaques
+ANALYSIS_RATE = 11025
+FRAME_SIZE = 512
+HOP_SIZE = 256
+# Compression log des magnitudes avant le flux spectral
+COMPRESSION = 100
+
+# Sélection des pics : au-dessus de la moyenne locale + THRESHOLD_DELTA (flux normalisé),
+# maximum local, et au moins MIN_ONSET_GAP secondes après l'attaque précédente
+THRESHOLD_WINDOW = 0.5
+PEAK_WINDOW = 0.05
+THRESHOLD_DELTA = 0.05
+MIN_ONSET_GAP = 0.1
+
+# Tempo cherché par autocorrélation du flux spectral dans cette plage
+MIN_BPM = 90
+MAX_BPM = 200
+# Pas (en trames) de l'affinage de la période autour du pic d'autocorrélation
+PERIOD_STEP = 0.05
+
+DRAFT_SUFFIX = ".draft.pyfnf"
+AUDIO_EXTS = (".mp3", ".ogg", ".wav")
+
+
+def downsample(samples, channels, rate):
+    # Premier canal, une valeur sur step : retourne (échantillons, fréquence effective)
+    step = max(1, round(rate / ANALYSIS_RATE))
+    return samples[::channels * step], rate / step
+
+
+def read_wav(path):
+    with wave.open(path, "rb") as f:
+        if f.getsampwidth() != 2:
+            raise ValueError("WAV 16 bits uniquement")
+        samples = array("h", f.readframes(f.getnframes()))
+        if sys.byteorder != "little":
+            samples.byteswap()
+        samples, rate = downsample(samples, f.getnchannels(), f.getframerate())
+    return array("f", (s / 32768 for s in samples)), rate
+
+
+def decode_audio(path):
+    # Retourne (échantillons mono en float, fréquence). Le WAV est lu directement,
+    # le reste passe par QAudioDecoder dans une boucle d'événements locale.
+    if path.lower().endswith(".wav"):
+        return read_wav(path)
+
+    # Une application Qt doit exister (et rester en vie) pendant le décodage
+    app = QCoreApplication.instance() or QCoreApplication([])
+    decoder = QAudioDecoder()
+    audio_format = QAudioFormat()
+    audio_format.setSampleFormat(QAudioFormat.Int16)
+    audio_format.setChannelCount(1)
+    audio_format.setSampleRate(ANALYSIS_RATE)
+    decoder.setAudioFormat(audio_format)
+    decoder.setSource(QUrl.fromLocalFile(os.path.abspath(path)))
+
+    samples = array("f")
+    result = {"rate": ANALYSIS_RATE, "error": None}
+    loop = QEventLoop()
+
+    def on_buffer():
+        buffer = decoder.read()
+        audio_format = buffer.format()
+        if audio_format.sampleFormat() not in SAMPLE_TYPES:
+            return
+        typecode, scale = SAMPLE_TYPES[audio_format.sampleFormat()]
+        chunk = array(typecode)
+        chunk.frombytes(bytes(buffer.constData())[:buffer.byteCount()])
+        chunk, result["rate"] = downsample(chunk, audio_format.channelCount(), audio_format.sampleRate())
+        samples.extend(s / scale for s in chunk)
+
+    def on_error(*args):
+        result["error"] = decoder.errorString()
+        loop.quit()
+
+    decoder.bufferReady.connect(on_buffer)
+    decoder.finished.connect(loop.quit)
+    decoder.error.connect(on_error)
+    decoder.start()
+    loop.exec()
+    decoder.stop()
+    if result["error"]:
+        raise ValueError(result["error"])
+    if not samples:
+        raise ValueError("Aucun échantillon décodé")
+    return samples, result["rate"]
+
+
+# FFT radix-2 itérative : permutation et facteurs de rotation calculés une fois
+BIT_REVERSE = [int(format(i, f"0{FRAME_SIZE.bit_length() - 1}b")[::-1], 2) for i in range(FRAME_SIZE)]
+TWIDDLES = [cmath.exp(-2j * math.pi * k / FRAME_SIZE) for k in range(FRAME_SIZE // 2)]
+WINDOW = [0.5 - 0.5 * math.cos(2 * math.pi * i / FRAME_SIZE) for i in range(FRAME_SIZE)]
+
+
+def fft(frame):
+    values = [frame[i] for i in BIT_REVERSE]
+    size = 2
+    while size <= FRAME_SIZE:
+        half = size // 2
+        step = FRAME_SIZE // size
+        for start in range(0, FRAME_SIZE, size):
+            for k in range(half):
+                i = start + k
+                t = TWIDDLES[k * step] * values[i + half]
+                values[i + half] = values[i] - t
+                values[i] += t
+        size *= 2
+    return values
+
+
+def spectral_flux(samples):
+    # Par trame : somme des hausses de magnitude (log) par rapport à la trame précédente,
+    # et centroïde spectral (en index de bin) utilisé pour choisir la direction
+    flux = array("d")
+    centroids = array("d")
+    # Pas de trame précédente pour la première : son flux est nul, sinon tout le spectre
+    # compterait comme une hausse et donnerait une fausse attaque au début
+    previous = None
+    for start in range(0, len(samples) - FRAME_SIZE + 1, HOP_SIZE):
+        frame = [s * w for s, w in zip(samples[start:start + FRAME_SIZE], WINDOW)]
+        magnitudes = [math.log1p(COMPRESSION * abs(c)) for c in fft(frame)[:FRAME_SIZE // 2]]
+        flux.append(sum(m - p for m, p in zip(magnitudes, previous) if m > p) if previous else 0.0)
+        total = sum(magnitudes)
+        centroids.append(sum(i * m for i, m in enumerate(magnitudes)) / total if total else 0.0)
+        previous = magnitudes
+    return flux, centroids
+
+
+def pick_onsets(flux, rate):
+    # Index des trames retenues comme attaques
+    if not flux:
+        return []
+    peak = max(flux) or 1.0
+    flux = [f / peak for f in flux]
+    frame_time = HOP_SIZE / rate
+    mean_radius = max(1, int(THRESHOLD_WINDOW / frame_time))
+    peak_radius = max(1, int(PEAK_WINDOW / frame_time))
+    min_gap = MIN_ONSET_GAP / frame_time
+
+    # Moyenne locale par sommes cumulées
+    prefix = [0.0]
+    for f in flux:
+        prefix.append(prefix[-1] + f)
+
+    onsets = []
+    count = len(flux)
+    for i, f in enumerate(flux):
+        lo, hi = max(0, i - mean_radius), min(count, i + mean_radius + 1)
+        if f < (prefix[hi] - prefix[lo]) / (hi - lo) + THRESHOLD_DELTA:
+            continue
+        if f < max(flux[max(0, i - peak_radius):i + peak_radius + 1]):
+            continue
+        if onsets and i - onsets[-1] < min_gap:
+            continue
+        onsets.append(i)
+    return onsets
+
+
+def assign_lanes(onsets, centroids):
+    # Quartiles du centroïde sur les attaques retenues : graves à gauche, aigus à droite,
+    # et chaque direction reçoit à peu près autant de notes
+    values = sorted(centroids[i] for i in onsets)
+    if not values:
+        return []
+    bounds = [values[len(values) * k // len(LANES)] for k in range(1, len(LANES))]
+    return [LANES[bisect_right(bounds, centroids[i])] for i in onsets]
+
+
+def estimate_tempo(flux, rate):
+    # Retourne (bpm, temps du premier beat). Période grossière = pic d'autocorrélation du flux,
+    # puis période fine et phase = le couple qui aligne le plus de flux sur une grille régulière
+    frame_time = HOP_SIZE / rate
+    count = len(flux)
+    min_lag = max(1, int(60 / MAX_BPM / frame_time))
+    max_lag = min(count - 1, int(math.ceil(60 / MIN_BPM / frame_time)))
+    if max_lag <= min_lag + 1:
+        raise ValueError("Chanson trop courte pour estimer le tempo")
+
+    mean = sum(flux) / count
+    centered = [f - mean for f in flux]
+    lag = max(range(min_lag, max_lag + 1),
+              key=lambda lag: sum(a * b for a, b in zip(centered, centered[lag:])) / (count - lag))
+
+    def comb(candidate):
+        period, phase = candidate
+        return sum(flux[round(phase + k * period)] for k in range(int((count - 1 - phase) / period) + 1))
+
+    candidates = [(lag - 1 + step * PERIOD_STEP, phase)
+                  for step in range(int(2 / PERIOD_STEP) + 1)
+                  for phase in range(lag)]
+    period, phase = max(candidates, key=comb)
+    return 60 / (period * frame_time), (phase * HOP_SIZE + FRAME_SIZE / 2) / rate
+
+
+def detect_notes(samples, rate, flux=None, centroids=None):
+    if flux is None:
+        flux, centroids = spectral_flux(samples)
+    onsets = pick_onsets(flux, rate)
+    lanes = assign_lanes(onsets, centroids)
+    # Temps au centre de la trame
+    return [{"time": round((i * HOP_SIZE + FRAME_SIZE / 2) / rate, 3), "direction": lane}
+            for i, lane in zip(onsets, lanes)]
+
+
+def draft_path(audio_path, out_dir=None):
+    name = os.path.splitext(os.path.basename(audio_path))[0] + DRAFT_SUFFIX
+    return os.path.join(out_dir or os.path.dirname(audio_path), name)
+
+
+def draft_chart(audio_path, out_path=None):
+    # Exécuté dans un process du pool : décode, détecte et écrit le brouillon .pyfnf.
+    # Retourne un rapport (jamais d'exception, comme validate_mod)
+    audio_path = os.path.abspath(audio_path)
+    out_path = out_path or draft_path(audio_path)
+    report = {"audio": audio_path, "chart": out_path, "notes": 0, "bpm": None, "error": None}
+    try:
+        samples, rate = decode_audio(audio_path)
+        flux, centroids = spectral_flux(samples)
+        notes = detect_notes(samples, rate, flux, centroids)
+        bpm, first_beat = estimate_tempo(flux, rate)
+        tempo = TempoMap(((first_beat, round(bpm, 2)),))
+        write_chart(out_path, {"song": audio_path, "bpm": round(bpm, 2), "tempo": tempo.to_data(), "notes": notes})
+        report["notes"] = len(notes)
+        report["bpm"] = round(bpm, 2)
+    except (OSError, ValueError, EOFError, wave.Error) as e:
+        report["error"] = str(e)
+    return report
+
+
+def detect_tempo(audio_path):
+    report = {"audio": audio_path, "bpm": None, "offset": None, "error": None}
+    try:
+        samples, rate = decode_audio(audio_path)
+        bpm, first_beat = estimate_tempo(spectral_flux(samples)[0], rate)
+        report["bpm"] = round(bpm, 2)
+        report["offset"] = round(first_beat, 3)
+    except (OSError, ValueError, EOFError, wave.Error) as e:
+        report["error"] = str(e)
+    return report
+
+
+def spawn_pool(workers=None):
+    # spawn : pas de fork d'un process qui a déjà une application Qt
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def draft_folder(folder, out_dir=None, workers=None):
+    paths = [os.path.join(folder, f) for f in sorted(os.listdir(folder)) if f.lower().endswith(AUDIO_EXTS)]
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    outputs = [draft_path(path, out_dir) for path in paths]
+    with spawn_pool(workers) as pool:
+        return list(pool.map(draft_chart, paths, outputs))
+
+
+class AutoCharter(QObject):
+    # Brouillon calculé dans un process à part ; le rapport revient sur le thread UI via le signal
+    drafted = Signal(dict)
+    tempo_detected = Signal(dict)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = spawn_pool(1)
+
+    def submit(self, audio_path):
+        self.run(draft_chart, audio_path, self.drafted)
+
+    def submit_tempo(self, audio_path):
+        self.run(detect_tempo, audio_path, self.tempo_detected)
+
+    def run(self, job, audio_path, signal):
+        try:
+            future = self.pool.submit(job, audio_path)
+        except BrokenProcessPool:
+            # Le process précédent est mort : nouveau pool
+            self.pool = spawn_pool(1)
+            future = self.pool.submit(job, audio_path)
+        future.add_done_callback(lambda f: signal.emit(self.report(audio_path, f)))
+
+    @staticmethod
+    def report(audio_path, future):
+        # Toujours un rapport : un process tué ou une annulation devient une erreur affichable
+        try:
+            return future.result()
+        except (Exception, CancelledError) as e:
+            error = str(e) or type(e).__name__
+            return {"audio": audio_path, "chart": None, "notes": 0, "bpm": None, "offset": None, "error": error}
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    # python -m editor.auto_chart chanson_ou_dossier [dossier_de_sortie]
+    target = sys.argv[1]
+    out_dir = sys.argv[2] if len(sys.argv) > 2 else None
+    if os.path.isdir(target):
+        reports = draft_folder(target, out_dir)
+    else:
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        reports = [draft_chart(target, draft_path(os.path.abspath(target), out_dir))]
+    print(json.dumps(reports, indent=2))
@@ -1,16 +1,36 @@
 from PySide6.QtWidgets import (
     QMainWindow, QWidget, QPushButton, QLabel, QVBoxLayout, QHBoxLayout,
-    QListWidget, QFileDialog, QLineEdit, QAbstractItemView, QMessageBox
+    QListView, QFileDialog, QLineEdit, QAbstractItemView, QMessageBox, QComboBox
 )
 from PySide6.QtCore import Qt, QTimer, QUrl
 from PySide6.QtMultimedia import QMediaPlayer, QAudioOutput
-from PySide6.QtGui import QPainter, QColor, QFont
+from PySide6.QtGui import QPainter, QColor, QFont, QPixmap
 import os
 import time
-import copy
 import random
+from bisect import bisect_left, bisect_right
 
 from editor.file_handler import save_map, load_map
+from editor.auto_chart import AutoCharter
+from editor.history import EditHistory, AddNote, DeleteNote, EditNote, RetimeNotes
+from editor.journal import EditJournal, recover
+from editor.note_model import NoteListModel
+from editor.waveform import WaveformLoader
+from editor.waveform_view import WaveformView
+from game.chart import NoteStore
+from game.tempo import TempoMap
+
+# Subdivisions de beat proposées pour la grille et la quantification
+SNAP_DIVISIONS = (1, 2, 3, 4, 6, 8)
+# En dessous de cet écart (pixels) entre deux lignes, la grille n'est pas dessinée
+MIN_GRID_SPACING = 4
+
+NOTE_COLORS = {
+    "left": "#ff4c4c",
+    "down": "#4cff4c",
+    "up": "#4c4cff",
+    "right": "#ffff4c",
+}
 
 class NotesPlayerWidget(QWidget):
     def __init__(self, editor_window):
@@ -22,6 +42,31 @@ class NotesPlayerWidget(QWidget):
         self.active = False
         self.setMinimumHeight(100)
 
+        # Pastilles pré-rendues par direction
+        self.glyphs = {}
+
+    def refresh(self, *args):
+        self.update()
+
+    def build_glyphs(self):
+        ratio = self.devicePixelRatioF()
+        size = self.note_radius * 2
+        font = QFont("Arial", 10, QFont.Bold)
+        for direction, color in NOTE_COLORS.items():
+            glyph = QPixmap(int(size * ratio), int(size * ratio))
+            glyph.setDevicePixelRatio(ratio)
+            glyph.fill(Qt.transparent)
+            painter = QPainter(glyph)
+            painter.setRenderHint(QPainter.Antialiasing)
+            painter.setBrush(QColor(color))
+            painter.setPen(Qt.NoPen)
+            painter.drawEllipse(0, 0, size, size)
+            painter.setPen(QColor("#000000"))
+            painter.setFont(font)
+            painter.drawText(self.note_radius - 6, self.note_radius + 6, direction[0].upper())
+            painter.end()
+            self.glyphs[direction] = glyph
+
     def start(self):
         self.current_time = 0.0
         self.active = True
@@ -51,26 +96,27 @@ class NotesPlayerWidget(QWidget):
         if not self.active:
             return
 
-        for note in self.editor.map_data["notes"]:
-            dt = note["time"] - self.current_time
-            x = width - dt * self.speed
-            if 0 <= x <= width:
-                color_map = {
-                    "left": "#ff4c4c",
-                    "down": "#4cff4c",
-                    "up": "#4c4cff",
-                    "right": "#ffff4c",
-                }
-                color = QColor(color_map.get(note["direction"], "#ffffff"))
-                painter.setBrush(color)
-                painter.setPen(Qt.NoPen)
-                painter.drawEllipse(int(x), center_y - self.note_radius, self.note_radius*2, self.note_radius*2)
-
-                painter.setPen(QColor("#000000"))
-                font = QFont("Arial", 10, QFont.Bold)
-                painter.setFont(font)
-                direction_letter = note["direction"][0].upper()
-                painter.drawText(int(x) + self.note_radius - 6, center_y + 6, direction_letter)
+        if not self.glyphs:
+            self.build_glyphs()
+
+        # Grille du tempo sur la fenêtre visible : beats en clair, subdivisions en sombre
+        tempo = self.editor.tempo
+        division = self.editor.snap_division()
+        end_time = self.current_time + width / self.speed
+        if self.speed * 60 / tempo.bpm_at(self.current_time) / division >= MIN_GRID_SPACING:
+            for t, on_beat in tempo.grid(self.current_time, end_time, division):
+                painter.setPen(QColor("#555555" if on_beat else "#2a2a2a"))
+                x = int(width - (t - self.current_time) * self.speed + self.note_radius)
+                painter.drawLine(x, 0, x, height)
+
+        # Notes triées par temps : seules celles de la fenêtre visible sont parcourues
+        notes = self.editor.map_data["notes"]
+        start = bisect_left(notes.times, self.current_time)
+        end = bisect_right(notes.times, end_time)
+        top = center_y - self.note_radius
+        for i in range(start, end):
+            x = width - (notes.times[i] - self.current_time) * self.speed
+            painter.drawPixmap(int(x), top, self.glyphs[notes.direction(i)])
 
 class EditorWindow(QMainWindow):
     def __init__(self):
@@ -79,12 +125,16 @@ class EditorWindow(QMainWindow):
         self.resize(700, 600)
 
        
-        self.map_data = {"song": "", "bpm": 120, "notes": []}
+        self.map_data = {"song": "", "bpm": 120, "notes": NoteStore()}
+        self.map_path = None
         self.start_time = None
 
+        # Autosave : journal des modifications à côté de la map, rejoué au démarrage après un crash
+        self.journal = EditJournal()
+
         # Undo/Redo
-        self.history = []
-        self.history_index = -1
+        self.history = EditHistory()
+        self.tempo = TempoMap.from_data(self.map_data)
 
         
         self.player = QMediaPlayer()
@@ -101,8 +151,22 @@ class EditorWindow(QMainWindow):
       
         self.notes_player = NotesPlayerWidget(self)
 
+        # Forme d'onde de la chanson, calculée en arrière-plan (ou lue depuis le cache)
+        self.waveform_view = WaveformView()
+        self.waveform_view.set_tempo(self.tempo)
+        self.waveform_loader = WaveformLoader(self)
+        self.waveform_loader.ready.connect(self.waveform_view.set_pyramid)
+        self.waveform_loader.failed.connect(lambda error: print(f"Forme d'onde indisponible : {error}"))
+
+        # Brouillon de chart par détection d'attaques, calculé hors du thread UI
+        self.auto_charter = AutoCharter(self)
+        self.auto_charter.drafted.connect(self.on_chart_drafted)
+        self.auto_charter.tempo_detected.connect(self.on_tempo_detected)
+
         
         self.setup_ui()
+        self.note_model.journal = self.journal
+        self.restore_session(None)
 
     def setup_ui(self):
         main_layout = QVBoxLayout()
@@ -115,13 +179,14 @@ class EditorWindow(QMainWindow):
         self.btn_stop = QPushButton("■ Stop")
         self.btn_add_note = QPushButton("➕ Ajouter note")
         self.btn_delete_note = QPushButton("❌ Supprimer note")
+        self.btn_auto_chart = QPushButton("🤖 Auto-chart")
         self.btn_undo = QPushButton("↩ Undo")
         self.btn_redo = QPushButton("↪ Redo")
         self.btn_save = QPushButton("💾 Sauvegarder .pyfnf")
         self.btn_load = QPushButton("📂 Charger .pyfnf")
 
         for btn in (self.btn_choose_song, self.btn_play, self.btn_pause, self.btn_stop,
-                    self.btn_add_note, self.btn_delete_note, self.btn_undo, self.btn_redo,
+                    self.btn_add_note, self.btn_delete_note, self.btn_auto_chart, self.btn_undo, self.btn_redo,
                     self.btn_save, self.btn_load):
             top_btn_layout.addWidget(btn)
 
@@ -132,15 +197,20 @@ class EditorWindow(QMainWindow):
         main_layout.addWidget(self.time_label)
 
    
-        self.note_list = QListWidget()
+        self.note_model = NoteListModel(self.map_data["notes"], self)
+        for signal in (self.note_model.rowsInserted, self.note_model.rowsRemoved,
+                       self.note_model.dataChanged, self.note_model.modelReset):
+            signal.connect(self.notes_player.refresh)
+        self.note_list = QListView()
+        self.note_list.setModel(self.note_model)
+        self.note_list.setUniformItemSizes(True)
         self.note_list.setSelectionMode(QAbstractItemView.SingleSelection)
-        self.note_list.setDragDropMode(QAbstractItemView.InternalMove)
-        self.note_list.setDefaultDropAction(Qt.MoveAction)
-        self.note_list.model().rowsMoved.connect(self.on_notes_reordered)
+        self.note_list.setDragDropMode(QAbstractItemView.NoDragDrop)
         main_layout.addWidget(self.note_list, 1)
 
     
         main_layout.addWidget(self.notes_player)
+        main_layout.addWidget(self.waveform_view)
 
  
         edit_layout = QHBoxLayout()
@@ -154,6 +224,22 @@ class EditorWindow(QMainWindow):
         edit_layout.addWidget(self.btn_apply_edit)
         main_layout.addLayout(edit_layout)
 
+        # Tempo : segments "début=bpm" séparés par des virgules, grille et quantification
+        tempo_layout = QHBoxLayout()
+        self.edit_tempo = QLineEdit()
+        self.edit_tempo.setPlaceholderText("Tempo (ex: 0.35=128, 62.5=140)")
+        self.btn_apply_tempo = QPushButton("🎼 Appliquer tempo")
+        self.btn_detect_tempo = QPushButton("🥁 Détecter BPM")
+        self.snap_combo = QComboBox()
+        for division in SNAP_DIVISIONS:
+            self.snap_combo.addItem(f"1/{division}", division)
+        self.snap_combo.setCurrentIndex(SNAP_DIVISIONS.index(4))
+        self.btn_quantize = QPushButton("📏 Quantifier")
+        for widget in (self.edit_tempo, self.btn_apply_tempo, self.btn_detect_tempo, self.snap_combo, self.btn_quantize):
+            tempo_layout.addWidget(widget)
+        main_layout.addLayout(tempo_layout)
+        self.show_tempo()
+
     
         container = QWidget()
         container.setLayout(main_layout)
@@ -165,24 +251,37 @@ class EditorWindow(QMainWindow):
         self.btn_stop.clicked.connect(self.stop_music)
         self.btn_add_note.clicked.connect(self.add_note)
         self.btn_delete_note.clicked.connect(self.delete_selected_note)
+        self.btn_auto_chart.clicked.connect(self.auto_chart)
         self.btn_save.clicked.connect(self.save_map)
         self.btn_load.clicked.connect(self.load_map)
         self.btn_undo.clicked.connect(self.undo)
         self.btn_redo.clicked.connect(self.redo)
         self.btn_apply_edit.clicked.connect(self.apply_note_edit)
-        self.note_list.itemSelectionChanged.connect(self.load_selected_note_into_edit)
+        self.btn_apply_tempo.clicked.connect(self.apply_tempo)
+        self.btn_detect_tempo.clicked.connect(self.detect_tempo)
+        self.btn_quantize.clicked.connect(self.quantize_notes)
+        self.snap_combo.currentIndexChanged.connect(self.notes_player.refresh)
+        self.note_list.selectionModel().currentRowChanged.connect(self.load_selected_note_into_edit)
 
     def update_time_label(self):
         if self.start_time:
             elapsed = time.perf_counter() - self.start_time
             self.time_label.setText(f"Temps : {elapsed:.2f}s")
             self.notes_player.update_time(elapsed)
+            self.waveform_view.set_playhead(elapsed)
 
     def choose_song(self):
         path, _ = QFileDialog.getOpenFileName(self, "Choisir une musique", "", "*.mp3 *.ogg *.wav")
         if path:
             self.map_data["song"] = path
+            self.journal.append({"op": "meta", "fields": {"song": path}})
             self.setWindowTitle(f"Éditeur ULTIME - {os.path.basename(path)}")
+            self.load_waveform()
+
+    def load_waveform(self):
+        self.waveform_view.clear()
+        if self.map_data["song"] and os.path.exists(self.map_data["song"]):
+            self.waveform_loader.load(self.map_data["song"])
 
     def play_music(self):
         if not self.map_data["song"]:
@@ -193,6 +292,7 @@ class EditorWindow(QMainWindow):
         self.player.play()
         self.timer.start(50)
         self.notes_player.start()
+        self.waveform_view.resume_following()
 
     def pause_music(self):
         self.player.pause()
@@ -211,45 +311,109 @@ class EditorWindow(QMainWindow):
             return
         current_time = time.perf_counter() - self.start_time
         direction = random.choice(self.directions)  # <-- ici on prend une direction aléatoire -> merci chatgpt
-        note = {"time": round(current_time, 2), "direction": direction}
-        self.map_data["notes"].append(note)
-        self.push_history()
-        self.refresh_note_list()
-        self.note_list.setCurrentRow(len(self.map_data["notes"]) - 1)
+        command = AddNote(round(current_time, 2), direction)
+        self.execute(command)
+        self.select_note(command.note_id, command.time)
 
     def delete_selected_note(self):
-        row = self.note_list.currentRow()
+        row = self.current_row()
+        if row >= 0:
+            notes = self.map_data["notes"]
+            self.execute(DeleteNote(notes.ids[row], notes.time(row), notes.direction(row)))
+
+    def auto_chart(self):
+        if not self.map_data["song"]:
+            QMessageBox.warning(self, "Erreur", "Choisissez d'abord une musique !")
+            return
+        if len(self.map_data["notes"]):
+            answer = QMessageBox.question(self, "Auto-chart", "Remplacer les notes actuelles par un brouillon généré ?")
+            if answer != QMessageBox.Yes:
+                return
+        self.btn_auto_chart.setEnabled(False)
+        self.auto_charter.submit(self.map_data["song"])
+
+    def on_chart_drafted(self, report):
+        self.btn_auto_chart.setEnabled(True)
+        if report["error"]:
+            QMessageBox.warning(self, "Erreur", f"Auto-chart impossible : {report['error']}")
+            return
+        self.open_map(report["chart"])
+        QMessageBox.information(self, "Auto-chart", f"{report['notes']} notes générées ({os.path.basename(report['chart'])}).")
+
+    def snap_division(self):
+        return self.snap_combo.currentData() or 1
+
+    def show_tempo(self):
+        self.edit_tempo.setText(", ".join(f"{start:g}={bpm:g}" for start, bpm in zip(self.tempo.starts, self.tempo.bpms)))
+
+    def set_tempo(self, tempo, record=True):
+        self.tempo = tempo
+        self.map_data["tempo"] = tempo.to_data()
+        self.map_data["bpm"] = tempo.bpms[0]
+        if record:
+            self.journal.append({"op": "meta", "fields": {"tempo": self.map_data["tempo"], "bpm": self.map_data["bpm"]}})
+        self.show_tempo()
+        self.notes_player.refresh()
+        self.waveform_view.set_tempo(tempo)
+
+    def apply_tempo(self):
+        try:
+            segments = []
+            for part in self.edit_tempo.text().split(","):
+                start, bpm = part.split("=")
+                segments.append((float(start), float(bpm)))
+            self.set_tempo(TempoMap(segments))
+        except ValueError:
+            QMessageBox.warning(self, "Erreur", "Tempo invalide (format : début=bpm, début=bpm...).")
+
+    def detect_tempo(self):
+        if not self.map_data["song"]:
+            QMessageBox.warning(self, "Erreur", "Choisissez d'abord une musique !")
+            return
+        self.btn_detect_tempo.setEnabled(False)
+        self.auto_charter.submit_tempo(self.map_data["song"])
+
+    def on_tempo_detected(self, report):
+        self.btn_detect_tempo.setEnabled(True)
+        if report["error"]:
+            QMessageBox.warning(self, "Erreur", f"Détection du tempo impossible : {report['error']}")
+            return
+        self.set_tempo(TempoMap(((report["offset"], report["bpm"]),)))
+
+    def quantize_notes(self):
+        notes = self.map_data["notes"]
+        if not len(notes):
+            return
+        snapped = self.tempo.quantize(notes.times, self.snap_division())
+        if snapped != notes.times:
+            self.execute(RetimeNotes(notes.times, snapped))
+            self.load_selected_note_into_edit()
+
+    def current_row(self):
+        return self.note_list.currentIndex().row()
+
+    def select_row(self, row):
+        index = self.note_model.index(row)
+        self.note_list.setCurrentIndex(index)
+        self.note_list.scrollTo(index)
+
+    def select_note(self, note_id, time):
+        row = self.note_model.find(note_id, time)
         if row >= 0:
-            del self.map_data["notes"][row]
-            self.push_history()
-            self.refresh_note_list()
-
-    def refresh_note_list(self):
-        self.note_list.clear()
-        for n in self.map_data["notes"]:
-            self.note_list.addItem(f"{n['time']:.2f}s → {n['direction']}")
-
-    def on_notes_reordered(self, *args):
-        new_notes = []
-        for i in range(self.note_list.count()):
-            text = self.note_list.item(i).text()
-            time_str, dir_str = text.split("s → ")
-            new_notes.append({"time": float(time_str), "direction": dir_str})
-        self.map_data["notes"] = new_notes
-        self.push_history()
-
-    def load_selected_note_into_edit(self):
-        row = self.note_list.currentRow()
+            self.select_row(row)
+
+    def load_selected_note_into_edit(self, *args):
+        row = self.current_row()
         if row < 0 or row >= len(self.map_data["notes"]):
             self.edit_time.clear()
             self.edit_dir.clear()
             return
-        note = self.map_data["notes"][row]
-        self.edit_time.setText(f"{note['time']:.2f}")
-        self.edit_dir.setText(note["direction"])
+        notes = self.map_data["notes"]
+        self.edit_time.setText(f"{notes.time(row):.2f}")
+        self.edit_dir.setText(notes.direction(row))
 
     def apply_note_edit(self):
-        row = self.note_list.currentRow()
+        row = self.current_row()
         if row < 0:
             return
         try:
@@ -263,53 +427,80 @@ class EditorWindow(QMainWindow):
         if new_dir not in self.directions:
             QMessageBox.warning(self, "Erreur", f"Direction invalide, doit être une de : {', '.join(self.directions)}")
             return
-        self.map_data["notes"][row] = {"time": round(new_time, 2), "direction": new_dir}
-        self.push_history()
-        self.refresh_note_list()
-        self.note_list.setCurrentRow(row)
+        notes = self.map_data["notes"]
+        old = (notes.time(row), notes.direction(row))
+        command = EditNote(notes.ids[row], old, (round(new_time, 2), new_dir))
+        self.execute(command)
+        # La note a pu changer de ligne : on la suit par son identifiant
+        self.select_note(command.note_id, command.new[0])
+        self.load_selected_note_into_edit()
 
     def save_map(self):
-        path, _ = QFileDialog.getSaveFileName(self, "Sauvegarder la map", "", "*.pyfnf")
+        path, _ = QFileDialog.getSaveFileName(self, "Sauvegarder la map", "", "*.pyfnf;;*.pyfnfb")
         if path:
-            save_map(path, self.map_data)
+            try:
+                save_map(path, self.map_data)
+            except OSError as e:
+                QMessageBox.warning(self, "Erreur", f"Sauvegarde impossible : {e}")
+                return
+            # La map sur disque est à jour : l'ancien journal est supprimé, un nouveau part de là
+            self.journal.discard()
+            self.map_path = path
+            self.journal.start(path, self.map_data)
             QMessageBox.information(self, "Succès", "Map sauvegardée avec succès.")
 
     def load_map(self):
-        path, _ = QFileDialog.getOpenFileName(self, "Charger une map", "", "*.pyfnf")
+        path, _ = QFileDialog.getOpenFileName(self, "Charger une map", "", "*.pyfnf *.pyfnfb")
         if path:
-            self.map_data = load_map(path)
-            self.push_history(reset=True)
-            self.refresh_note_list()
+            self.open_map(path)
             QMessageBox.information(self, "Succès", "Map chargée avec succès.")
 
-    # Undo/Redo
-    def push_history(self, reset=False):
-        if reset:
-            self.history = []
-            self.history_index = -1
+    def open_map(self, path):
+        self.restore_session(path)
+
+    def restore_session(self, path):
+        # Modifications non sauvegardées (crash ou fermeture sans sauvegarde) : proposées à la reprise.
+        # path None = map jamais sauvegardée
+        recovered = recover(path)
+        if recovered is not None:
+            answer = QMessageBox.question(self, "Récupération", "Des modifications non sauvegardées ont été trouvées. Les restaurer ?")
+            if answer != QMessageBox.Yes:
+                recovered = None
+        if recovered is not None:
+            data, seq = recovered
         else:
-            self.history = self.history[:self.history_index + 1]
+            data, seq = load_map(path) if path else self.map_data, 0
 
-        snapshot = copy.deepcopy(self.map_data)
-        self.history.append(snapshot)
-        self.history_index += 1
+        self.map_data = data
+        self.map_path = path
+        self.history.clear()
+        self.note_model.set_notes(self.map_data["notes"])
+        self.set_tempo(TempoMap.from_data(self.map_data), record=False)
+        self.load_waveform()
+        self.journal.start(path, data, seq, recovered=recovered is not None)
 
-        if len(self.history) > 50:
-            self.history.pop(0)
-            self.history_index -= 1
+    def closeEvent(self, event):
+        self.journal.close()
+        self.auto_charter.shutdown()
+        super().closeEvent(event)
+
+    # Undo/Redo
+    # Les commandes passent par le modèle pour que la liste ne mette à jour que les lignes touchées
+    def execute(self, command):
+        command.apply(self.note_model)
+        self.history.push(command)
+        self.journal.compact(self.map_data)
 
     def undo(self):
-        if self.history_index > 0:
-            self.history_index -= 1
-            self.map_data = copy.deepcopy(self.history[self.history_index])
-            self.refresh_note_list()
+        if self.history.undo(self.note_model) is not None:
+            self.journal.compact(self.map_data)
+            self.load_selected_note_into_edit()
         else:
             QMessageBox.information(self, "Undo", "Plus d'actions à annuler.")
 
     def redo(self):
-        if self.history_index < len(self.history) - 1:
-            self.history_index += 1
-            self.map_data = copy.deepcopy(self.history[self.history_index])
-            self.refresh_note_list()
+        if self.history.redo(self.note_model) is not None:
+            self.journal.compact(self.map_data)
+            self.load_selected_note_into_edit()
         else:
             QMessageBox.information(self, "Redo", "Plus d'actions à rétablir.")
@@ -1,9 +1,10 @@
-import json
+from game.chart_format import read_chart, write_chart
 
 def save_map(path, map_data):
-    with open(path, "w") as f:
-        json.dump(map_data, f, indent=2)
+    # .pyfnfb -> format binaire, sinon JSON ; écriture atomique (fichier temporaire puis rename)
+    write_chart(path, map_data)
 
 def load_map(path):
-    with open(path, "r") as f:
-        return json.load(f)
+    data = read_chart(path)
+    data["notes"] = data["notes"].copy().sorted()  # copie éditable (un .pyfnfb est lu via mmap), triée par temps
+    return data
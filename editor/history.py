@@ -0,0 +1,115 @@
+from array import array
+from collections import deque
+
+# Budget mémoire de l'historique (estimation) : les plus vieilles actions sont oubliées au-delà
+HISTORY_MAX_BYTES = 64 * 1024 * 1024
+NOTE_DELTA_BYTES = 64
+
+
+# Les commandes désignent les notes par identifiant stable : la position d'une note change
+# dès qu'une note est ajoutée avant elle, l'identifiant jamais. Les notes restent triées par temps.
+class AddNote:
+    def __init__(self, time, direction, note_id=None):
+        self.time = time
+        self.direction = direction
+        self.note_id = note_id
+
+    def apply(self, notes):
+        # Le rétablissement réutilise l'identifiant attribué la première fois
+        self.note_id = notes.add(self.time, self.direction, self.note_id)
+
+    def revert(self, notes):
+        notes.remove(self.note_id, self.time)
+
+    def size(self):
+        return NOTE_DELTA_BYTES
+
+
+class DeleteNote:
+    def __init__(self, note_id, time, direction):
+        self.note_id = note_id
+        self.time = time
+        self.direction = direction
+
+    def apply(self, notes):
+        notes.remove(self.note_id, self.time)
+
+    def revert(self, notes):
+        notes.add(self.time, self.direction, self.note_id)
+
+    def size(self):
+        return NOTE_DELTA_BYTES
+
+
+class EditNote:
+    # Changer le temps déplace la note : retirée puis réinsérée à sa place, même identifiant
+    def __init__(self, note_id, old, new):
+        self.note_id = note_id
+        self.old = old
+        self.new = new
+
+    def apply(self, notes):
+        notes.remove(self.note_id, self.old[0])
+        notes.add(*self.new, self.note_id)
+
+    def revert(self, notes):
+        notes.remove(self.note_id, self.new[0])
+        notes.add(*self.old, self.note_id)
+
+    def size(self):
+        return NOTE_DELTA_BYTES
+
+
+class RetimeNotes:
+    # Quantification : tous les temps changent d'un coup, l'ordre des notes reste le même
+    def __init__(self, old, new):
+        self.old = array("d", old)
+        self.new = array("d", new)
+
+    def apply(self, notes):
+        notes.set_times(self.new)
+
+    def revert(self, notes):
+        notes.set_times(self.old)
+
+    def size(self):
+        return 16 * len(self.new)
+
+
+class EditHistory:
+    # Journal d'actions : chaque entrée ne garde que son delta inverse, pas de copie de la chart
+    def __init__(self, max_bytes=HISTORY_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.bytes = 0
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.bytes = 0
+
+    def push(self, command):
+        self.redo_stack.clear()
+        self.undo_stack.append(command)
+        self.bytes += command.size()
+        while self.bytes > self.max_bytes and len(self.undo_stack) > 1:
+            self.bytes -= self.undo_stack.popleft().size()
+
+    def undo(self, notes):
+        if not self.undo_stack:
+            return None
+        command = self.undo_stack.pop()
+        self.bytes -= command.size()
+        command.revert(notes)
+        self.redo_stack.append(command)
+        return command
+
+    def redo(self, notes):
+        if not self.redo_stack:
+            return None
+        command = self.redo_stack.pop()
+        command.apply(notes)
+        self.undo_stack.append(command)
+        self.bytes += command.size()
+        return command
@@ -0,0 +1,271 @@
+import hashlib
+import json
+import os
+import struct
+import sys
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from editor.file_handler import load_map
+from game.chart import NoteStore
+from game.chart_format import encode_binary, decode_binary
+from game.disk_cache import atomic_write
+
+# Journal d'édition : chaque modification est ajoutée en fin de fichier (une ligne JSON
+# numérotée), flushée tout de suite et synchronisée sur disque au plus toutes les
+# FSYNC_INTERVAL secondes. Tous les COMPACT_EVERY enregistrements, un checkpoint complet
+# est écrit en arrière-plan et le journal repart de zéro.
+FSYNC_INTERVAL = 1.0
+COMPACT_EVERY = 500
+
+JOURNAL_SUFFIX = ".journal"
+OLD_JOURNAL_SUFFIX = ".journal.old"
+CHECKPOINT_SUFFIX = ".checkpoint"
+# Les maps jamais sauvegardées sont journalisées ici
+AUTOSAVE_DIR = os.path.join(os.path.dirname(__file__), "..", ".cache", "autosave")
+UNTITLED = "untitled.pyfnf"
+
+# Checkpoint : en-tête, identifiants des notes (uint32 little-endian), puis la chart en .pyfnfb
+CHECKPOINT_MAGIC = b"PYFNFJ"
+CHECKPOINT_VERSION = 1
+CHECKPOINT_HEADER = struct.Struct("<6sHQII")
+
+
+def journal_base(chart_path):
+    if not chart_path:
+        return os.path.abspath(os.path.join(AUTOSAVE_DIR, UNTITLED))
+    path = os.path.abspath(chart_path)
+    if os.access(os.path.dirname(path), os.W_OK):
+        return path
+    # Dossier en lecture seule : journal dans l'autosave, nommé d'après le chemin complet
+    key = hashlib.blake2b(path.encode(), digest_size=8).hexdigest()
+    return os.path.abspath(os.path.join(AUTOSAVE_DIR, f"{key}-{os.path.basename(path)}"))
+
+
+def encode_checkpoint(data, seq):
+    store = data["notes"]
+    ids = array("I", store.ids)
+    if sys.byteorder != "little":
+        ids.byteswap()
+    header = CHECKPOINT_HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION, seq, store.next_id, len(store))
+    return header + ids.tobytes() + encode_binary(data)
+
+
+def decode_checkpoint(raw):
+    magic, version, seq, next_id, count = CHECKPOINT_HEADER.unpack_from(raw)
+    if magic != CHECKPOINT_MAGIC or version != CHECKPOINT_VERSION:
+        raise ValueError("Checkpoint invalide")
+    offset = CHECKPOINT_HEADER.size
+    ids = array("I", raw[offset:offset + 4 * count])
+    if sys.byteorder != "little":
+        ids.byteswap()
+    data = decode_binary(raw[offset + 4 * count:])
+    store = data["notes"].copy()
+    if len(store) != count:
+        raise ValueError("Checkpoint incomplet")
+    # decode_binary rattache les champs en plus par position : on les remet sur les vrais ids
+    store.extras = {ids[row]: fields for row, fields in store.extras.items()}
+    store.ids = ids
+    store.next_id = next_id
+    data["notes"] = store
+    return data, seq
+
+
+def apply_record(data, record):
+    # Rejoue une modification sur l'état (même effet que les opérations du NoteListModel)
+    notes = data["notes"]
+    op = record["op"]
+    if op == "add":
+        notes.add(record["time"], record["direction"], record["id"])
+    elif op == "remove":
+        notes.remove(record["id"], record["time"])
+    elif op == "retime":
+        notes.set_times(record["times"])
+    elif op == "meta":
+        data.update(record["fields"])
+    else:
+        raise ValueError(f"Opération de journal inconnue : {op}")
+
+
+def read_records(path):
+    # Une ligne coupée (crash pendant l'écriture) termine le journal
+    records = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break
+    except OSError:
+        pass
+    return records
+
+
+def recover(chart_path):
+    # Retourne (état, dernier numéro d'enregistrement) si une session non sauvegardée
+    # existe pour cette chart, sinon None
+    base = journal_base(chart_path)
+    checkpoint = base + CHECKPOINT_SUFFIX
+    journals = [base + OLD_JOURNAL_SUFFIX, base + JOURNAL_SUFFIX]
+    if not os.path.exists(checkpoint) and not any(os.path.exists(path) for path in journals):
+        return None
+
+    try:
+        with open(checkpoint, "rb") as f:
+            data, seq = decode_checkpoint(f.read())
+    except (OSError, ValueError, struct.error):
+        if chart_path and os.path.exists(chart_path):
+            data = load_map(chart_path)
+        else:
+            data = {"song": "", "bpm": 120, "notes": NoteStore()}
+        seq = 0
+
+    base_seq = seq
+    for path in journals:
+        for record in read_records(path):
+            if record.get("seq", 0) <= seq:
+                continue
+            try:
+                apply_record(data, record)
+            except (KeyError, TypeError, ValueError, IndexError):
+                break
+            seq = record["seq"]
+    if seq == base_seq and not os.path.exists(checkpoint):
+        return None
+    return data, seq
+
+
+def snapshot(data):
+    # Copie de l'état pour le thread du checkpoint (les notes sont copiées, pas partagées)
+    return dict(data, notes=data["notes"].copy())
+
+
+def remove_files(*paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class EditJournal:
+    def __init__(self):
+        self.pool = ThreadPoolExecutor(max_workers=1)
+        self.compacting = None
+        self.base = None
+        self.data = None
+        self.checkpointed = False
+        self.file = None
+        self.seq = 0
+        self.pending = 0
+        self.last_fsync = 0.0
+
+    @property
+    def journal_path(self):
+        return self.base + JOURNAL_SUFFIX
+
+    @property
+    def old_journal_path(self):
+        return self.base + OLD_JOURNAL_SUFFIX
+
+    @property
+    def checkpoint_path(self):
+        return self.base + CHECKPOINT_SUFFIX
+
+    def start(self, chart_path, data, seq=0, recovered=False):
+        # Journal vide pour chart_path sur l'état data (le dict de l'éditeur, modifié en place).
+        # Le journal ne se rejoue que sur un checkpoint portant les identifiants de notes de
+        # l'éditeur (load_map les renumérote selon la position dans le fichier) : il est écrit
+        # à la première modification, rien n'est donc créé tant que la map n'est pas touchée.
+        # Un état récupéré est figé tout de suite, avant que son journal soit supprimé.
+        self.close()
+        self.base = journal_base(chart_path)
+        self.data = data
+        self.seq = seq
+        self.pending = 0
+        if not recovered:
+            self.discard()
+            self.checkpointed = False
+            return
+        self.checkpointed = self.write_first_checkpoint()
+        if self.checkpointed:
+            remove_files(self.old_journal_path, self.journal_path)
+
+    def write_first_checkpoint(self):
+        try:
+            os.makedirs(os.path.dirname(self.base), exist_ok=True)
+            atomic_write(self.checkpoint_path, encode_checkpoint(self.data, self.seq))
+            return True
+        except OSError as e:
+            # Sans checkpoint, le journal ne pourrait pas être rejoué correctement
+            print(f"Journal désactivé : {e}")
+            self.base = None
+            return False
+
+    def append(self, record):
+        if self.base is None:
+            return
+        self.seq += 1
+        if not self.checkpointed:
+            # Première modification : le checkpoint la contient déjà, pas besoin de l'enregistrement
+            self.checkpointed = self.write_first_checkpoint()
+            return
+        if self.file is None:
+            os.makedirs(os.path.dirname(self.base), exist_ok=True)
+            self.file = open(self.journal_path, "a", encoding="utf-8")
+        record["seq"] = self.seq
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        now = time.monotonic()
+        if now - self.last_fsync >= FSYNC_INTERVAL:
+            os.fsync(self.file.fileno())
+            self.last_fsync = now
+        self.pending += 1
+
+    def compact(self, data):
+        # Le journal courant est mis de côté (.old) et un nouveau commence ; le thread écrit le
+        # checkpoint puis supprime le .old. Un crash à n'importe quel moment reste récupérable.
+        if self.pending < COMPACT_EVERY or self.file is None:
+            return
+        if self.compacting is not None and not self.compacting.done():
+            return
+        if os.path.exists(self.old_journal_path):
+            # Checkpoint précédent en échec : son journal est gardé, pas de nouvelle compaction
+            return
+        self.close_file()
+        os.replace(self.journal_path, self.old_journal_path)
+        self.pending = 0
+        self.compacting = self.pool.submit(self.write_checkpoint, snapshot(data), self.seq, self.base)
+
+    def write_checkpoint(self, data, seq, base):
+        try:
+            atomic_write(base + CHECKPOINT_SUFFIX, encode_checkpoint(data, seq))
+            remove_files(base + OLD_JOURNAL_SUFFIX)
+        except OSError as e:
+            print(f"Checkpoint non écrit : {e}")
+
+    def discard(self):
+        # Après une sauvegarde : la chart sur disque est à jour, le journal ne sert plus
+        self.close_file()
+        self.wait()
+        if self.base is not None:
+            remove_files(self.journal_path, self.old_journal_path, self.checkpoint_path)
+        self.pending = 0
+
+    def wait(self):
+        if self.compacting is not None:
+            self.compacting.result()
+            self.compacting = None
+
+    def close_file(self):
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+            self.file = None
+
+    def close(self):
+        self.close_file()
+        self.wait()
@@ -0,0 +1,74 @@
+from PySide6.QtCore import Qt, QAbstractListModel, QModelIndex
+
+
+class NoteListModel(QAbstractListModel):
+    # Modèle de la liste de notes, directement branché sur le NoteStore : la vue ne
+    # demande que les lignes visibles, et chaque édition émet un signal ciblé.
+    # Expose la même API que NoteStore pour que les commandes d'historique passent par lui.
+    # L'ordre des lignes est celui des temps : pas de réordonnancement à la main.
+
+    def __init__(self, notes, parent=None):
+        super().__init__(parent)
+        self.notes = notes
+        # Journal d'autosave : reçoit chaque modification faite par les commandes
+        self.journal = None
+
+    def log(self, record):
+        if self.journal is not None:
+            self.journal.append(record)
+
+    def set_notes(self, notes):
+        self.beginResetModel()
+        self.notes = notes
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.notes)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        row = index.row()
+        return f"{self.notes.time(row):.2f}s → {self.notes.direction(row)}"
+
+    # API NoteStore
+    def __len__(self):
+        return len(self.notes)
+
+    def time(self, row):
+        return self.notes.time(row)
+
+    def direction(self, row):
+        return self.notes.direction(row)
+
+    def insert(self, row, time, direction, note_id=None):
+        self.beginInsertRows(QModelIndex(), row, row)
+        note_id = self.notes.insert(row, time, direction, note_id)
+        self.endInsertRows()
+        return note_id
+
+    def add(self, time, direction, note_id=None):
+        note_id = self.insert(self.notes.insert_position(time), time, direction, note_id)
+        self.log({"op": "add", "id": note_id, "time": time, "direction": direction})
+        return note_id
+
+    def remove(self, note_id, time):
+        row = self.notes.find(note_id, time)
+        if row < 0:
+            raise KeyError(f"Note {note_id} introuvable à {time}s")
+        del self[row]
+        self.log({"op": "remove", "id": note_id, "time": time})
+
+    def find(self, note_id, time):
+        return self.notes.find(note_id, time)
+
+    def __delitem__(self, row):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.notes[row]
+        self.endRemoveRows()
+
+    def set_times(self, times):
+        self.notes.set_times(times)
+        self.log({"op": "retime", "times": list(times)})
+        if len(self.notes):
+            self.dataChanged.emit(self.index(0), self.index(len(self.notes) - 1), [Qt.DisplayRole])
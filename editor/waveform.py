@@ -0,0 +1,250 @@
+import hashlib
+import os
+import struct
+import sys
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from PySide6.QtCore import QObject, Signal, QUrl
+from PySide6.QtMultimedia import QAudioDecoder, QAudioFormat
+
+from game.disk_cache import evict_lru, touch
+
+# Pyramide de pics min/max : niveau 0 = un couple (min, max) par bloc de BASE_BLOCK
+# échantillons, chaque niveau suivant regroupe LEVEL_FACTOR blocs du précédent.
+# Les pics sont ramenés en int16 quel que soit le format décodé.
+BASE_BLOCK = 256
+LEVEL_FACTOR = 4
+MIN_LEVEL_SIZE = 64
+
+# Fichier .peaks : en-tête, puis par niveau le nombre de blocs, les min et les max en int16 little-endian
+CACHE_DIR = os.path.join(os.path.dirname(__file__), "..", ".cache", "waveforms")
+CACHE_MAX_BYTES = 128 * 1024 * 1024
+MAGIC = b"PYFNFW"
+VERSION = 1
+HEADER = struct.Struct("<6sHIIII")
+LEVEL_HEADER = struct.Struct("<I")
+
+# Format d'échantillon décodé -> (typecode array, pleine échelle)
+SAMPLE_TYPES = {
+    QAudioFormat.Int16: ("h", 32768),
+    QAudioFormat.Int32: ("i", 2 ** 31),
+    QAudioFormat.Float: ("f", 1.0),
+}
+
+
+class PeakPyramid:
+    def __init__(self, sample_rate, mins=(), maxs=()):
+        self.sample_rate = sample_rate
+        self.levels = [(array("h", mins), array("h", maxs))]
+
+    def build_levels(self):
+        # Chaque niveau est réduit depuis le précédent, jamais depuis le PCM
+        del self.levels[1:]
+        mins, maxs = self.levels[0]
+        while len(mins) > MIN_LEVEL_SIZE:
+            mins = array("h", (min(mins[i:i + LEVEL_FACTOR]) for i in range(0, len(mins), LEVEL_FACTOR)))
+            maxs = array("h", (max(maxs[i:i + LEVEL_FACTOR]) for i in range(0, len(maxs), LEVEL_FACTOR)))
+            self.levels.append((mins, maxs))
+
+    def block_duration(self, level):
+        return BASE_BLOCK * LEVEL_FACTOR ** level / self.sample_rate
+
+    def duration(self):
+        return len(self.levels[0][0]) * self.block_duration(0)
+
+    def level_for(self, seconds_per_pixel):
+        # Niveau le plus grossier dont un bloc tient encore dans un pixel
+        level = 0
+        while level + 1 < len(self.levels) and self.block_duration(level + 1) <= seconds_per_pixel:
+            level += 1
+        return level
+
+    def columns(self, start, seconds_per_pixel, width):
+        # (min, max) par colonne de pixel sur [start, start + width * seconds_per_pixel[,
+        # None pour les colonnes hors de la chanson
+        level = self.level_for(seconds_per_pixel)
+        mins, maxs = self.levels[level]
+        block = self.block_duration(level)
+        result = []
+        for x in range(width):
+            first = int((start + x * seconds_per_pixel) / block)
+            last = max(first + 1, int((start + (x + 1) * seconds_per_pixel) / block))
+            if first < 0 or first >= len(mins):
+                result.append(None)
+                continue
+            result.append((min(mins[first:last]), max(maxs[first:last])))
+        return result
+
+    def encode(self):
+        data = [HEADER.pack(MAGIC, VERSION, self.sample_rate, BASE_BLOCK, LEVEL_FACTOR, len(self.levels))]
+        for mins, maxs in self.levels:
+            if sys.byteorder != "little":
+                mins, maxs = array("h", mins), array("h", maxs)
+                mins.byteswap()
+                maxs.byteswap()
+            data += [LEVEL_HEADER.pack(len(mins)), mins.tobytes(), maxs.tobytes()]
+        return b"".join(data)
+
+    @classmethod
+    def decode(cls, raw):
+        magic, version, sample_rate, base_block, factor, count = HEADER.unpack_from(raw)
+        if magic != MAGIC or version != VERSION or base_block != BASE_BLOCK or factor != LEVEL_FACTOR:
+            raise ValueError("Cache de forme d'onde invalide")
+        pyramid = cls(sample_rate)
+        pyramid.levels = []
+        offset = HEADER.size
+        for _ in range(count):
+            (size,) = LEVEL_HEADER.unpack_from(raw, offset)
+            offset += LEVEL_HEADER.size
+            mins = array("h", raw[offset:offset + 2 * size])
+            maxs = array("h", raw[offset + 2 * size:offset + 4 * size])
+            if sys.byteorder != "little":
+                mins.byteswap()
+                maxs.byteswap()
+            pyramid.levels.append((mins, maxs))
+            offset += 4 * size
+        if not pyramid.levels:
+            raise ValueError("Cache de forme d'onde vide")
+        return pyramid
+
+
+def audio_key(path):
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    digest.update(f"{VERSION}:{BASE_BLOCK}:{LEVEL_FACTOR}".encode())
+    return digest.hexdigest()
+
+
+def cache_path(key):
+    return os.path.join(CACHE_DIR, key + ".peaks")
+
+
+def load_cached(key):
+    path = cache_path(key)
+    try:
+        with open(path, "rb") as f:
+            pyramid = PeakPyramid.decode(f.read())
+    except (OSError, ValueError, struct.error):
+        return None
+    touch(path)
+    return pyramid
+
+
+def save_cached(key, pyramid):
+    path = cache_path(key)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(pyramid.encode())
+        os.replace(tmp, path)
+        evict_lru(CACHE_DIR, CACHE_MAX_BYTES)
+    except OSError as e:
+        print(f"Cache de forme d'onde non écrit : {e}")
+
+
+def lookup(path):
+    # Hash de la chanson et lecture du cache : exécuté hors du thread UI
+    try:
+        key = audio_key(path)
+    except OSError as e:
+        return {"key": None, "pyramid": None, "error": str(e)}
+    return {"key": key, "pyramid": load_cached(key), "error": None}
+
+
+class WaveformLoader(QObject):
+    # Décode la chanson une seule fois en PCM mono ; chaque buffer est réduit au niveau 0
+    # dès réception, le PCM complet n'est jamais gardé en mémoire.
+    # ready(pyramid) est émis depuis le cache disque si la chanson a déjà été analysée.
+    ready = Signal(object)
+    failed = Signal(str)
+    # Résultat de lookup(), ramené du thread de hash vers le thread UI
+    looked_up = Signal(str, dict)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.decoder = QAudioDecoder(self)
+        self.decoder.bufferReady.connect(self.on_buffer)
+        self.decoder.finished.connect(self.on_finished)
+        self.decoder.error.connect(self.on_error)
+        self.key = None
+        self.pyramid = None
+        self.pending = array("h")
+        self.scale = 32768
+        self.path = None
+        self.pool = ThreadPoolExecutor(max_workers=1)
+        self.looked_up.connect(self.on_looked_up)
+
+    def load(self, path):
+        self.decoder.stop()
+        self.path = path
+        future = self.pool.submit(lookup, path)
+        future.add_done_callback(lambda f: self.looked_up.emit(path, f.result()))
+
+    def on_looked_up(self, path, result):
+        # Une autre chanson a été choisie entre-temps : résultat périmé
+        if path != self.path:
+            return
+        if result["error"]:
+            self.failed.emit(result["error"])
+            return
+        self.key = result["key"]
+        if result["pyramid"] is not None:
+            self.ready.emit(result["pyramid"])
+            return
+
+        audio_format = QAudioFormat()
+        audio_format.setSampleFormat(QAudioFormat.Int16)
+        audio_format.setChannelCount(1)
+        self.decoder.setAudioFormat(audio_format)
+        self.decoder.setSource(QUrl.fromLocalFile(path))
+        self.pyramid = None
+        self.pending = array("h")
+        self.decoder.start()
+
+    def on_buffer(self):
+        buffer = self.decoder.read()
+        audio_format = buffer.format()
+        if audio_format.sampleFormat() not in SAMPLE_TYPES:
+            return
+        typecode, scale = SAMPLE_TYPES[audio_format.sampleFormat()]
+        samples = array(typecode)
+        samples.frombytes(bytes(buffer.constData())[:buffer.byteCount()])
+        channels = audio_format.channelCount()
+        if channels > 1:
+            # Le backend n'a pas respecté le mono demandé : premier canal seulement
+            samples = samples[::channels]
+
+        if self.pyramid is None:
+            self.pyramid = PeakPyramid(audio_format.sampleRate())
+            self.pending = array(typecode)
+            self.scale = scale
+        self.pending.extend(samples)
+        self.reduce(final=False)
+
+    def reduce(self, final):
+        mins, maxs = self.pyramid.levels[0]
+        pending = self.pending
+        full = len(pending) if final else len(pending) - len(pending) % BASE_BLOCK
+        factor = 32767 / self.scale
+        for i in range(0, full, BASE_BLOCK):
+            block = pending[i:i + BASE_BLOCK]
+            mins.append(int(min(block) * factor))
+            maxs.append(int(max(block) * factor))
+        del pending[:full]
+
+    def on_finished(self):
+        if self.pyramid is None:
+            self.failed.emit("Aucun échantillon décodé")
+            return
+        self.reduce(final=True)
+        self.pyramid.build_levels()
+        save_cached(self.key, self.pyramid)
+        self.ready.emit(self.pyramid)
+
+    def on_error(self, *args):
+        self.failed.emit(self.decoder.errorString())
@@ -0,0 +1,125 @@
+from PySide6.QtWidgets import QAbstractScrollArea
+from PySide6.QtCore import Qt, QLineF
+from PySide6.QtGui import QPainter, QColor
+
+# Zoom en pixels par seconde ; chaque cran de molette (Ctrl) multiplie par ZOOM_STEP
+DEFAULT_ZOOM = 100
+MIN_ZOOM = 1
+MAX_ZOOM = 5000
+ZOOM_STEP = 1.25
+# Lignes de beat masquées quand elles seraient plus serrées que ça (pixels)
+MIN_BEAT_SPACING = 6
+
+
+class WaveformView(QAbstractScrollArea):
+    # Forme d'onde défilante sous la bande de notes : la barre de défilement est en
+    # millisecondes, et seul le morceau visible est lu depuis le niveau de pyramide adapté au zoom
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pyramid = None
+        self.tempo = None
+        self.zoom = DEFAULT_ZOOM
+        self.playhead = 0.0
+        self.follow = True
+        self.setMinimumHeight(80)
+        self.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
+        self.horizontalScrollBar().valueChanged.connect(self.viewport().update)
+        self.horizontalScrollBar().sliderPressed.connect(self.stop_following)
+
+    def set_pyramid(self, pyramid):
+        self.pyramid = pyramid
+        self.update_scroll_range()
+        self.viewport().update()
+
+    def set_tempo(self, tempo):
+        self.tempo = tempo
+        self.viewport().update()
+
+    def clear(self):
+        self.set_pyramid(None)
+
+    def start(self):
+        return self.horizontalScrollBar().value() / 1000
+
+    def visible_seconds(self):
+        return self.viewport().width() / self.zoom
+
+    def update_scroll_range(self):
+        bar = self.horizontalScrollBar()
+        duration = self.pyramid.duration() if self.pyramid else 0
+        page = int(self.visible_seconds() * 1000)
+        bar.setRange(0, max(0, int(duration * 1000) - page))
+        bar.setPageStep(page)
+        bar.setSingleStep(max(1, page // 10))
+
+    def set_playhead(self, t):
+        self.playhead = t
+        if self.follow:
+            start = self.start()
+            if not start <= t < start + self.visible_seconds():
+                self.horizontalScrollBar().setValue(int(t * 1000))
+        self.viewport().update()
+
+    def stop_following(self):
+        self.follow = False
+
+    def resume_following(self):
+        self.follow = True
+
+    def set_zoom(self, zoom, anchor_x=0):
+        # Le temps sous anchor_x reste au même endroit après le zoom
+        anchor_t = self.start() + anchor_x / self.zoom
+        self.zoom = min(MAX_ZOOM, max(MIN_ZOOM, zoom))
+        self.update_scroll_range()
+        self.horizontalScrollBar().setValue(int((anchor_t - anchor_x / self.zoom) * 1000))
+        self.viewport().update()
+
+    def wheelEvent(self, event):
+        steps = event.angleDelta().y() / 120
+        if event.modifiers() & Qt.ControlModifier:
+            self.set_zoom(self.zoom * ZOOM_STEP ** steps, event.position().x())
+        else:
+            self.follow = False
+            bar = self.horizontalScrollBar()
+            bar.setValue(bar.value() - int(steps * bar.singleStep()))
+        event.accept()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.update_scroll_range()
+
+    def paintEvent(self, event):
+        painter = QPainter(self.viewport())
+        painter.fillRect(self.viewport().rect(), QColor("#1b1b1b"))
+        width = self.viewport().width()
+        height = self.viewport().height()
+        center_y = height / 2
+
+        if self.pyramid is None:
+            painter.setPen(QColor("#666666"))
+            painter.drawText(self.viewport().rect(), Qt.AlignCenter, "Pas de forme d'onde")
+            return
+
+        # Une ligne verticale min -> max par colonne de pixel
+        start = self.start()
+        scale = (height / 2 - 2) / 32768
+        lines = []
+        for x, peak in enumerate(self.pyramid.columns(start, 1 / self.zoom, width)):
+            if peak is not None:
+                low, high = peak
+                lines.append(QLineF(x, center_y - high * scale, x, center_y - low * scale))
+        painter.setPen(QColor("#3fa9f5"))
+        painter.drawLines(lines)
+
+        # Beats du tempo par-dessus la forme d'onde
+        end = start + width / self.zoom
+        if self.tempo is not None and self.zoom * 60 / self.tempo.bpm_at(start) >= MIN_BEAT_SPACING:
+            painter.setPen(QColor(255, 255, 255, 60))
+            painter.drawLines([QLineF((t - start) * self.zoom, 0, (t - start) * self.zoom, height)
+                               for t, _ in self.tempo.grid(start, end)])
+
+        x = (self.playhead - start) * self.zoom
+        if 0 <= x < width:
+            painter.setPen(QColor("#ff4c4c"))
+            painter.drawLine(QLineF(x, 0, x, height))
@@ -0,0 +1,71 @@
+import os
+
+from PySide6.QtCore import QObject, Signal, QUrl
+from PySide6.QtMultimedia import QMediaPlayer, QAudioOutput
+
+READY_STATUSES = (QMediaPlayer.LoadedMedia, QMediaPlayer.BufferingMedia, QMediaPlayer.BufferedMedia)
+
+
+class AudioPreloader(QObject):
+    # Ouvre et bufferise la chanson pendant que l'écran de jeu se construit ;
+    # ready est émis une fois le média prêt à jouer, failed (et error renseigné) sinon.
+    # prefetch() prépare la piste suivante sur un second lecteur, échangé au prochain
+    # load() du même fichier : player et output sont à relire après chaque load().
+    ready = Signal()
+    failed = Signal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.player, self.output = self.create_player()
+        self.next_player = None
+        self.next_output = None
+        self.is_ready = False
+        self.error = None
+
+    def create_player(self):
+        player = QMediaPlayer(self)
+        output = QAudioOutput(self)
+        player.setAudioOutput(output)
+        player.mediaStatusChanged.connect(lambda status, p=player: self.on_status(p, status))
+        return player, output
+
+    def load(self, path):
+        self.is_ready = False
+        self.error = None
+        # Pas de fichier : QMediaPlayer resterait en NoMedia sans jamais rien signaler
+        if not path or not os.path.exists(path):
+            self.fail(f"Fichier audio introuvable : {path!r}")
+            return
+        url = QUrl.fromLocalFile(path)
+        if self.next_player is not None and self.next_player.source() == url:
+            # Piste déjà préchargée (éventuellement déjà en erreur : on_status la signale)
+            self.player.stop()
+            self.player, self.next_player = self.next_player, self.player
+            self.output, self.next_output = self.next_output, self.output
+        else:
+            self.player.setSource(url)
+        self.on_status(self.player, self.player.mediaStatus())
+
+    def prefetch(self, path):
+        # Un fichier manquant n'est pas préchargé : le load() suivant le signalera
+        if not path or not os.path.exists(path):
+            if self.next_player is not None:
+                self.next_player.setSource(QUrl())
+            return
+        if self.next_player is None:
+            self.next_player, self.next_output = self.create_player()
+        self.next_player.setSource(QUrl.fromLocalFile(path))
+
+    def fail(self, error):
+        self.error = error
+        self.failed.emit(error)
+
+    def on_status(self, player, status):
+        # Les changements d'état du lecteur de préchargement sont lus à l'échange
+        if player is not self.player or self.is_ready or self.error is not None:
+            return
+        if status in READY_STATUSES:
+            self.is_ready = True
+            self.ready.emit()
+        elif status == QMediaPlayer.InvalidMedia:
+            self.fail(self.player.errorString())
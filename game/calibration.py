@@ -0,0 +1,144 @@
+import os
+import time
+from bisect import bisect_left
+from statistics import median
+
+from PySide6.QtCore import Qt, QTimer, QUrl, Signal
+from PySide6.QtMultimedia import QSoundEffect
+from PySide6.QtWidgets import QWidget, QLabel, QPushButton, QVBoxLayout, QHBoxLayout
+
+from .input_queue import EventTimestamps
+
+CLICK_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "assets", "sounds", "click.wav")
+BEAT_INTERVAL = 0.6  # 100 BPM
+BEAT_COUNT = 16
+MIN_TAPS = 6
+# Un appui à plus de 3 écarts absolus médians (MAD) de la médiane est ignoré
+OUTLIER_MADS = 3.0
+MIN_SPREAD = 0.01
+
+
+def compute_offset(beats, taps):
+    # Décalage moyen (en secondes) entre chaque appui et le battement le plus proche,
+    # après rejet des valeurs aberrantes. None si pas assez d'appuis exploitables.
+    if not beats:
+        return None
+    deltas = []
+    for tap in taps:
+        i = bisect_left(beats, tap)
+        nearest = min(beats[max(0, i - 1):i + 1], key=lambda b: abs(b - tap))
+        if abs(tap - nearest) < BEAT_INTERVAL / 2:
+            deltas.append(tap - nearest)
+    if len(deltas) < MIN_TAPS:
+        return None
+
+    center = median(deltas)
+    spread = max(MIN_SPREAD, 1.4826 * median(abs(d - center) for d in deltas))
+    kept = [d for d in deltas if abs(d - center) <= OUTLIER_MADS * spread]
+    if len(kept) < MIN_TAPS:
+        return None
+    return sum(kept) / len(kept)
+
+
+class CalibrationWindow(QWidget):
+    # Métronome : en mode audio on tape au son (la vue reste fixe), en mode visuel
+    # on tape sur le flash (sans son). Les décalages sont émis en millisecondes.
+    calibrated = Signal(int, int)
+
+    def __init__(self, audio_offset=0, visual_offset=0):
+        super().__init__()
+        self.setWindowTitle("Calibration")
+        self.resize(500, 400)
+        self.audio_offset = audio_offset
+        self.visual_offset = visual_offset
+        self.mode = None
+        self.beats = []
+        self.taps = []
+        # Même conversion des timestamps Qt que GameWindow.push_input : le délai de traitement
+        # de l'événement ne doit pas entrer dans le décalage mesuré
+        self.input_timestamps = EventTimestamps()
+
+        self.click = QSoundEffect(self)
+        self.click.setSource(QUrl.fromLocalFile(CLICK_PATH))
+
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.beat)
+        self.flash_timer = QTimer(self)
+        self.flash_timer.setSingleShot(True)
+        self.flash_timer.timeout.connect(lambda: self.set_flash(False))
+
+        layout = QVBoxLayout()
+        self.info = QLabel("Appuyez sur Espace à chaque battement.")
+        self.info.setAlignment(Qt.AlignCenter)
+        layout.addWidget(self.info)
+
+        self.flash = QLabel()
+        self.flash.setFixedSize(120, 120)
+        self.set_flash(False)
+        layout.addWidget(self.flash, alignment=Qt.AlignCenter)
+
+        self.result = QLabel()
+        self.result.setAlignment(Qt.AlignCenter)
+        layout.addWidget(self.result)
+        self.show_offsets()
+
+        btn_layout = QHBoxLayout()
+        self.btn_audio = QPushButton("🔊 Calibrer l'audio")
+        self.btn_visual = QPushButton("👁 Calibrer l'affichage")
+        self.btn_save = QPushButton("💾 Enregistrer")
+        for btn in (self.btn_audio, self.btn_visual, self.btn_save):
+            btn.setFocusPolicy(Qt.NoFocus)
+            btn_layout.addWidget(btn)
+        layout.addLayout(btn_layout)
+        self.setLayout(layout)
+
+        self.btn_audio.clicked.connect(lambda: self.start("audio"))
+        self.btn_visual.clicked.connect(lambda: self.start("visual"))
+        self.btn_save.clicked.connect(self.save)
+
+    def show_offsets(self):
+        self.result.setText(f"Décalage audio : {self.audio_offset} ms — Décalage affichage : {self.visual_offset} ms")
+
+    def set_flash(self, on):
+        self.flash.setStyleSheet(f"background-color: {'#00e676' if on else '#222'}; border-radius: 60px;")
+
+    def start(self, mode):
+        self.mode = mode
+        self.beats = []
+        self.taps = []
+        self.info.setText("Appuyez sur Espace à chaque battement...")
+        self.timer.start(int(BEAT_INTERVAL * 1000))
+
+    def beat(self):
+        # Le battement est daté au moment où le son / le flash est demandé
+        self.beats.append(time.perf_counter())
+        if self.mode == "audio":
+            self.click.play()
+        else:
+            self.set_flash(True)
+            self.flash_timer.start(80)
+        if len(self.beats) >= BEAT_COUNT:
+            self.timer.stop()
+            QTimer.singleShot(int(BEAT_INTERVAL * 1000), self.finish)
+
+    def finish(self):
+        offset = compute_offset(self.beats, self.taps)
+        if offset is None:
+            self.info.setText("Pas assez d'appuis réguliers, réessayez.")
+            return
+        if self.mode == "audio":
+            self.audio_offset = round(offset * 1000)
+        else:
+            self.visual_offset = round(offset * 1000)
+        self.info.setText("Calibration terminée.")
+        self.show_offsets()
+
+    def keyPressEvent(self, event):
+        if event.key() == Qt.Key_Space and not event.isAutoRepeat() and self.mode:
+            now = time.perf_counter()
+            self.taps.append(min(now, self.input_timestamps.to_perf(event.timestamp(), now)))
+
+    def save(self):
+        self.calibrated.emit(self.audio_offset, self.visual_offset)
+        self.close()
@@ -0,0 +1,186 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+from .tempo import TempoMap
+
+LANES = ("left", "down", "up", "right")
+LANE_IDS = {d: i for i, d in enumerate(LANES)}
+
+# États de jugement stockés dans NoteStore.state
+UNJUDGED = 0
+HIT = 1
+MISS = 2
+
+
+class NoteStore:
+    # Stockage compact des notes : temps en float64, direction en uint8 et état de jugement
+    # en bytearray, au lieu d'une liste de dicts. Partagé par le jeu, l'éditeur et les loaders.
+    # Chaque note a un identifiant stable ; les champs en plus de time/direction sont
+    # gardés à part dans extras, indexés par identifiant.
+    def __init__(self, times=(), lanes=()):
+        self.times = array("d", times)
+        self.lanes = array("B", lanes)
+        self.state = bytearray(len(self.times))
+        self.ids = array("I", range(len(self.times)))
+        self.next_id = len(self.times)
+        self.extras = {}
+
+    @classmethod
+    def from_buffers(cls, times, lanes):
+        # Vues en lecture seule (mmap d'un .pyfnfb) : pas de copie, pas d'édition possible
+        store = cls()
+        store.times = times
+        store.lanes = lanes
+        store.state = bytearray(len(times))
+        store.ids = array("I", range(len(times)))
+        store.next_id = len(times)
+        return store
+
+    @classmethod
+    def from_notes(cls, notes):
+        store = cls()
+        for note in notes:
+            note_id = store.append(note["time"], note["direction"])
+            extras = {k: v for k, v in note.items() if k not in ("time", "direction", "hit")}
+            if extras:
+                store.extras[note_id] = extras
+        return store
+
+    def to_notes(self):
+        return [self[i] for i in range(len(self))]
+
+    def __len__(self):
+        return len(self.times)
+
+    def __iter__(self):
+        for t, lane in zip(self.times, self.lanes):
+            yield t, LANES[lane]
+
+    def __getitem__(self, i):
+        note = {"time": self.times[i], "direction": LANES[self.lanes[i]]}
+        note.update(self.extras.get(self.ids[i], ()))
+        return note
+
+    def __delitem__(self, i):
+        del self.times[i]
+        del self.lanes[i]
+        del self.state[i]
+        del self.ids[i]
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def copy(self):
+        copy = NoteStore(self.times, self.lanes)
+        copy.state[:] = self.state
+        copy.ids = array("I", self.ids)
+        copy.next_id = self.next_id
+        copy.extras = dict(self.extras)
+        return copy
+
+    def time(self, i):
+        return self.times[i]
+
+    def direction(self, i):
+        return LANES[self.lanes[i]]
+
+    def append(self, time, direction):
+        return self.insert(len(self.times), time, direction)
+
+    def insert(self, i, time, direction, note_id=None):
+        # Retourne l'identifiant de la note ; note_id permet de réinsérer une note supprimée
+        if note_id is None:
+            note_id = self.next_id
+        self.next_id = max(self.next_id, note_id + 1)
+        self.times.insert(i, time)
+        self.lanes.insert(i, LANE_IDS[direction])
+        self.state.insert(i, UNJUDGED)
+        self.ids.insert(i, note_id)
+        return note_id
+
+    def set_times(self, times):
+        # Remplace tous les temps d'un coup (même nombre de notes, ordre conservé)
+        self.times[:] = array("d", times)
+
+    # Accès par identifiant, en supposant les notes triées par temps (invariant de l'éditeur)
+    def insert_position(self, time):
+        return bisect_right(self.times, time)
+
+    def find(self, note_id, time):
+        i = bisect_left(self.times, time)
+        while i < len(self.times) and self.times[i] == time:
+            if self.ids[i] == note_id:
+                return i
+            i += 1
+        return -1
+
+    def add(self, time, direction, note_id=None):
+        return self.insert(self.insert_position(time), time, direction, note_id)
+
+    def remove(self, note_id, time):
+        i = self.find(note_id, time)
+        if i < 0:
+            raise KeyError(f"Note {note_id} introuvable à {time}s")
+        del self[i]
+
+    def is_sorted(self):
+        return all(a <= b for a, b in zip(self.times, self.times[1:]))
+
+    def sorted(self):
+        if self.is_sorted():
+            return self
+        order = sorted(range(len(self.times)), key=self.times.__getitem__)
+        store = NoteStore((self.times[i] for i in order), (self.lanes[i] for i in order))
+        store.ids = array("I", (self.ids[i] for i in order))
+        store.next_id = self.next_id
+        store.extras = self.extras
+        return store
+
+    def reset_state(self):
+        self.state[:] = bytes(len(self.state))
+
+
+class Chart:
+    # Chart compilée une seule fois au chargement : notes triées, index par direction
+    # et agrégats (durée, nombre de notes, compteurs de jugement) lus en O(1)
+    def __init__(self, data):
+        self.song = data.get("song", "")
+        self.bpm = data.get("bpm", 120)
+        self.tempo = TempoMap.from_data(data)
+
+        notes = data.get("notes", [])
+        store = notes if isinstance(notes, NoteStore) else NoteStore.from_notes(notes)
+        self.store = store.sorted()
+        self.times = self.store.times
+        self.lanes = self.store.lanes
+        self.state = self.store.state
+
+        # Index par direction : positions globales des notes et leurs temps
+        self.lane_index = {d: array("I") for d in LANES}
+        self.lane_times = {d: array("d") for d in LANES}
+        for i, (t, lane) in enumerate(zip(self.times, self.lanes)):
+            self.lane_index[LANES[lane]].append(i)
+            self.lane_times[LANES[lane]].append(t)
+
+        self.note_count = len(self.store)
+        self.lane_counts = {d: len(index) for d, index in self.lane_index.items()}
+        self.duration = self.times[-1] if self.note_count else 0.0
+
+        self.hits = 0
+        self.misses = 0
+
+    def direction(self, i):
+        return LANES[self.lanes[i]]
+
+    def register_hit(self, i):
+        self.state[i] = HIT
+        self.hits += 1
+
+    def register_miss(self, i):
+        self.state[i] = MISS
+        self.misses += 1
+
+    def reset(self):
+        self.store.reset_state()
+        self.hits = 0
+        self.misses = 0
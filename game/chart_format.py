@@ -0,0 +1,120 @@
+import json
+import mmap
+import struct
+import sys
+from array import array
+
+from .chart import NoteStore
+from .disk_cache import atomic_write
+
+# Format binaire .pyfnfb :
+#   en-tête  : magic, version, nombre de notes, taille des métadonnées
+#   méta     : JSON utf-8 des champs hors notes (song, bpm...)
+#   padding  : jusqu'au multiple de 8 suivant
+#   notes    : temps en float64 little-endian, puis directions en uint8
+MAGIC = b"PYFNFB"
+VERSION = 1
+HEADER = struct.Struct("<6sHII")
+BINARY_EXT = ".pyfnfb"
+
+
+def is_binary(raw):
+    return bytes(raw[:len(MAGIC)]) == MAGIC
+
+
+def encode_binary(data):
+    notes = data.get("notes", [])
+    store = notes if isinstance(notes, NoteStore) else NoteStore.from_notes(notes)
+    meta = {k: v for k, v in data.items() if k != "notes"}
+    extras = {str(i): store.extras[note_id] for i, note_id in enumerate(store.ids) if note_id in store.extras}
+    if extras:
+        meta["note_extras"] = extras
+    meta = json.dumps(meta).encode("utf-8")
+
+    header = HEADER.pack(MAGIC, VERSION, len(store), len(meta)) + meta
+    header += bytes(-len(header) % 8)
+
+    times = array("d", store.times)
+    if sys.byteorder != "little":
+        times.byteswap()
+    return header + times.tobytes() + bytes(store.lanes)
+
+
+def decode_binary(buffer):
+    # Les notes restent des vues sur le buffer (mmap ou bytes) : aucun objet créé par note
+    view = memoryview(buffer)
+    if len(view) < HEADER.size:
+        raise ValueError("Fichier .pyfnfb tronqué")
+    magic, version, count, meta_len = HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise ValueError("Fichier .pyfnfb invalide")
+    if version > VERSION:
+        raise ValueError(f"Version de chart non supportée : {version}")
+
+    offset = HEADER.size
+    meta_end = offset + meta_len
+    notes_offset = meta_end + -meta_end % 8
+    if notes_offset + 9 * count > len(view):
+        raise ValueError("Fichier .pyfnfb tronqué")
+    data = json.loads(bytes(view[offset:meta_end]).decode("utf-8"))
+    if not isinstance(data, dict):
+        raise ValueError("Métadonnées .pyfnfb invalides")
+    offset = notes_offset
+
+    times = view[offset:offset + 8 * count].cast("d")
+    lanes = view[offset + 8 * count:offset + 9 * count].cast("B")
+    if sys.byteorder != "little":
+        times = array("d", times)
+        times.byteswap()
+    data["notes"] = NoteStore.from_buffers(times, lanes)
+    # Les ids valent la position dans le fichier, les champs en plus sont rattachés par position
+    try:
+        data["notes"].extras = {int(i): dict(fields) for i, fields in data.pop("note_extras", {}).items()}
+    except (AttributeError, TypeError) as e:
+        raise ValueError(f"Champs de notes invalides : {e}")
+    return data
+
+
+def loads_chart(raw):
+    # Accepte indifféremment du JSON ou du binaire, détecté par le magic
+    if is_binary(raw):
+        return decode_binary(raw)
+    data = json.loads(raw.decode("utf-8") if isinstance(raw, (bytes, bytearray)) else raw)
+    if not isinstance(data, dict):
+        raise ValueError("Chart invalide : un objet JSON est attendu")
+    try:
+        data["notes"] = NoteStore.from_notes(data.get("notes", []))
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"Note invalide : {e}")
+    return data
+
+
+def read_chart(path):
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) == MAGIC:
+            return decode_binary(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        f.seek(0)
+        return loads_chart(f.read())
+
+
+def write_chart(path, data, binary=None):
+    if binary is None:
+        binary = path.endswith(BINARY_EXT)
+    if binary:
+        atomic_write(path, encode_binary(data))
+        return
+    notes = data.get("notes", [])
+    data = dict(data, notes=notes.to_notes() if isinstance(notes, NoteStore) else notes)
+    atomic_write(path, json.dumps(data, indent=2).encode("utf-8"))
+
+
+def convert(src, dst):
+    # JSON -> binaire ou binaire -> JSON, sans perte (ordre des notes et métadonnées conservés)
+    data = read_chart(src)
+    data["notes"] = data["notes"].copy()  # détache les notes du mmap avant d'écrire
+    write_chart(dst, data)
+
+
+if __name__ == "__main__":
+    # python -m game.chart_format map.pyfnf map.pyfnfb
+    convert(sys.argv[1], sys.argv[2])
@@ -0,0 +1,49 @@
+import os
+import threading
+
+
+def touch(path):
+    # La date de modification sert d'horodatage LRU
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def evict_lru(directory, max_bytes):
+    # Supprime les fichiers les moins récemment utilisés jusqu'à repasser sous max_bytes
+    entries = []
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def atomic_write(path, data):
+    # Fichier temporaire complet et synchronisé, puis rename : un crash pendant l'écriture
+    # laisse l'ancien fichier intact, jamais un fichier à moitié écrit
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
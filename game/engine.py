@@ -0,0 +1,152 @@
+import json
+import sys
+import time
+from bisect import bisect_left
+
+from .chart import LANES
+from .song_loader import load_song_notes
+
+# Constantes de gameplay
+# Paliers de jugement : (nom, écart max en secondes, points), du plus précis au plus large
+JUDGEMENTS = (
+    ("sick", 0.045, 350),
+    ("good", 0.090, 200),
+    ("bad", 0.135, 100),
+    ("shit", 0.166, 50),
+)
+LATE_MISS_WINDOW = 50 / 300  # 50px sous la cible à la vitesse de notes par défaut
+MAX_LIFE = 100
+LIFE_LOSS = 15
+LIFE_GAIN = 5
+END_DELAY = 2
+
+
+class GameEngine:
+    # Logique de jeu sans Qt ni horloge : score, combo, vie et jugement des notes.
+    # Le temps est toujours fourni par l'appelant, ce qui permet de simuler une partie
+    # beaucoup plus vite que le temps réel.
+    def __init__(self, chart, judgements=JUDGEMENTS):
+        self.chart = chart
+        self.judgements = judgements
+        self.hit_window = judgements[-1][1]
+        self.reset()
+
+    def reset(self):
+        self.chart.reset()
+        self.score = 0
+        self.combo = 0
+        self.max_combo = 0
+        self.life = MAX_LIFE
+        self.judgement_counts = {name: 0 for name, _, _ in self.judgements}
+
+        # Curseurs sur les prochaines notes non jugées (index triés construits par la Chart)
+        self.miss_cursor = 0
+        self.lane_cursor = {d: 0 for d in LANES}
+
+    def find_note(self, direction, current_time):
+        index = self.chart.lane_index.get(direction)
+        if not index:
+            return None
+        times = self.chart.lane_times[direction]
+        state = self.chart.state
+
+        # Avance le curseur au-delà des notes déjà jugées
+        cursor = self.lane_cursor[direction]
+        while cursor < len(index) and state[index[cursor]]:
+            cursor += 1
+        self.lane_cursor[direction] = cursor
+
+        # Première note candidate dans la fenêtre, puis la plus proche en temps. Chaque candidate
+        # repasse le test de judge() : au bord de la fenêtre, les arrondis des bornes du bisect
+        # laisseraient passer une note qu'aucun palier n'accepte.
+        i = bisect_left(times, current_time - self.hit_window, cursor)
+        best = None
+        while i < len(index) and times[i] <= current_time + self.hit_window:
+            offset = abs(times[i] - current_time)
+            if not state[index[i]] and offset <= self.hit_window and (best is None or offset < abs(times[best] - current_time)):
+                best = i
+            i += 1
+        return None if best is None else index[best]
+
+    def judge(self, offset):
+        for name, window, points in self.judgements:
+            if abs(offset) <= window:
+                return name, points
+        return None, 0
+
+    def press(self, direction, current_time):
+        # Retourne le palier obtenu ("sick", "good"...), ou None pour un appui dans le vide (MISS)
+        note = self.find_note(direction, current_time)
+        if note is not None:
+            name, points = self.judge(self.chart.times[note] - current_time)
+            self.chart.register_hit(note)
+            self.judgement_counts[name] += 1
+            self.score += points + self.combo * 10
+            self.combo += 1
+            self.max_combo = max(self.max_combo, self.combo)
+            self.life = min(MAX_LIFE, self.life + LIFE_GAIN)
+            return name
+        self.combo = 0
+        self.life -= LIFE_LOSS
+        return None
+
+    def update(self, current_time):
+        # Toute note passée de plus de LATE_MISS_WINDOW sans être touchée -> MISS
+        missed = 0
+        limit = current_time - LATE_MISS_WINDOW
+        while self.miss_cursor < self.chart.note_count and self.chart.times[self.miss_cursor] < limit:
+            if not self.chart.state[self.miss_cursor]:
+                self.chart.register_miss(self.miss_cursor)
+                self.combo = 0
+                self.life -= LIFE_LOSS
+                missed += 1
+            self.miss_cursor += 1
+        return missed
+
+    def finished(self, current_time):
+        return current_time > self.chart.duration + END_DELAY or self.life <= 0
+
+    def result(self):
+        return {
+            "score": self.score,
+            "max_combo": self.max_combo,
+            "life": self.life,
+            "hits": self.chart.hits,
+            "misses": self.chart.misses,
+            "judgements": dict(self.judgement_counts),
+            "notes": self.chart.note_count,
+        }
+
+
+def simulate(chart, events):
+    # events : liste de (temps, direction) horodatés sur la chanson
+    engine = GameEngine(chart)
+    for t, direction in sorted(events, key=lambda e: e[0]):
+        engine.update(t)
+        if engine.life <= 0:
+            return engine
+        engine.press(direction, t)
+    engine.update(float("inf"))
+    return engine
+
+
+def autoplay_events(chart):
+    return [(t, chart.direction(i)) for i, t in enumerate(chart.times)]
+
+
+if __name__ == "__main__":
+    # python -m game.engine map.pyfnf [inputs.json] -> rejoue une partie sans affichage
+    chart = load_song_notes(sys.argv[1])
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], "r", encoding="utf-8") as f:
+            events = json.load(f)
+    else:
+        events = autoplay_events(chart)
+
+    start = time.perf_counter()
+    engine = simulate(chart, events)
+    elapsed = time.perf_counter() - start
+
+    result = engine.result()
+    result["simulation_time"] = elapsed
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,74 @@
+from array import array
+
+FRAME_INTERVAL = 0.016
+# Une frame est comptée comme perdue si l'intervalle dépasse 1.5x l'intervalle cible
+DROP_THRESHOLD = 1.5
+
+
+class RingBuffer:
+    # Tampon circulaire de taille fixe sur des floats (pas d'allocation par frame)
+    def __init__(self, size):
+        self.values = array("d", bytes(8 * size))
+        self.index = 0
+        self.count = 0
+
+    def push(self, value):
+        self.values[self.index] = value
+        self.index = (self.index + 1) % len(self.values)
+        self.count = min(self.count + 1, len(self.values))
+
+    def items(self):
+        if self.count < len(self.values):
+            return self.values[:self.count]
+        return self.values[self.index:] + self.values[:self.index]
+
+    def percentile(self, p):
+        if not self.count:
+            return 0.0
+        values = sorted(self.items())
+        return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+    def mean(self):
+        return sum(self.items()) / self.count if self.count else 0.0
+
+
+class FrameStats:
+    # Durées d'update et de paint + intervalle entre frames sur les N dernières frames
+    def __init__(self, size=240, target=FRAME_INTERVAL):
+        self.target = target
+        self.intervals = RingBuffer(size)
+        self.update_times = RingBuffer(size)
+        self.paint_times = RingBuffer(size)
+        self.dropped = 0
+        self.last_frame = None
+
+    def begin_frame(self, now):
+        interval = 0.0
+        if self.last_frame is not None:
+            interval = now - self.last_frame
+            self.intervals.push(interval)
+            if interval > self.target * DROP_THRESHOLD:
+                self.dropped += max(1, round(interval / self.target) - 1)
+        self.last_frame = now
+        return interval
+
+    def pause(self):
+        # Le temps passé en pause ne doit pas compter comme frames perdues
+        self.last_frame = None
+
+    def record_update(self, duration):
+        self.update_times.push(duration)
+
+    def record_paint(self, duration):
+        self.paint_times.push(duration)
+
+    def summary(self):
+        mean = self.intervals.mean()
+        return {
+            "fps": 1 / mean if mean else 0.0,
+            "p50": self.intervals.percentile(50) * 1000,
+            "p99": self.intervals.percentile(99) * 1000,
+            "update_p99": self.update_times.percentile(99) * 1000,
+            "paint_p99": self.paint_times.percentile(99) * 1000,
+            "dropped": self.dropped,
+        }
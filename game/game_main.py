@@ -1,21 +1,30 @@
+import math
 import os
 import time
 import random
-from PySide6.QtCore import Qt, QTimer, QUrl, QPropertyAnimation, QRect
-from PySide6.QtGui import QPainter, QColor, QPixmap, QFont, QMovie, QFontDatabase
-from PySide6.QtMultimedia import QMediaPlayer, QAudioOutput
+from bisect import bisect_right
+from PySide6.QtCore import Qt, QTimer, QPropertyAnimation, QRect, QEvent
+from PySide6.QtGui import QPainter, QColor, QPixmap, QFont, QMovie, QFontDatabase, QStaticText
 from PySide6.QtWidgets import (
     QMainWindow, QWidget, QLabel, QPushButton, QVBoxLayout
 )
-from .utils import load_song_notes
+from .song_loader import load_song_notes
+from .engine import GameEngine, MAX_LIFE
+from .song_clock import SongClock, SYNC_TIMEOUT
+from .audio_preload import AudioPreloader
+from .frame_stats import FrameStats, RingBuffer, FRAME_INTERVAL
+from .input_queue import InputQueue, EventTimestamps, KEY_DOWN, KEY_UP
 
 # Constantes
 NOTE_SPEED = 300
-HIT_WINDOW = 0.2
 TARGET_Y = 400
-MAX_LIFE = 100
-LIFE_LOSS = 15
-LIFE_GAIN = 5
+FRAME_INTERVAL_MS = int(FRAME_INTERVAL * 1000)
+FEEDBACK_STEP = 0.03
+# Effets calés sur le tempo : pulsation de la ligne cible à chaque beat, equalizer
+# relancé à chaque 1/BAR_DIVISION de beat
+BAR_DIVISION = 2
+BEAT_PULSE_DECAY = 4.0
+NOTE_SIZE = 40
 
 KEY_MAPPING = {
     Qt.Key_Left: "left",
@@ -35,9 +44,22 @@ ASSET_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "assets")
 FONT_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "assets", "Quicksand-Bold.ttf")
 
 class GameWindow(QMainWindow):
-    def __init__(self, map_path):
+    def __init__(self, map_path=None, chart=None, song_path=None):
         super().__init__()
 
+        # Chargé en premier : une map invalide lève ValueError avant l'affichage
+        self.chart = chart if chart is not None else load_song_notes(map_path)
+        self.song_path = song_path or self.chart.song
+
+        # Audio : chargé en arrière-plan pendant la construction de l'écran
+        self.preloader = AudioPreloader(self)
+        self.player = self.preloader.player
+        self.output = self.preloader.output
+        self.ui_ready = False
+        self.preloader.ready.connect(self.on_audio_ready)
+        self.preloader.failed.connect(self.on_audio_failed)
+        self.preloader.load(self.song_path)
+
         # Police custom
         if os.path.exists(FONT_PATH):
             fid = QFontDatabase.addApplicationFont(FONT_PATH)
@@ -56,69 +78,151 @@ class GameWindow(QMainWindow):
 
         self.showFullScreen()
 
-        self.map_data = load_song_notes(map_path)
-        self.notes = self.map_data["notes"]
-        self.score = 0
-        self.combo = 0
-        self.max_combo = 0
-        self.life = MAX_LIFE
+        self.engine = GameEngine(self.chart)
         self.paused = False
 
-        # Audio
-        self.player = QMediaPlayer()
-        self.output = QAudioOutput()
-        self.player.setAudioOutput(self.output)
+        # Latences mesurées par l'outil de calibration (ms), écrasées par config.json
+        self.audio_offset = 0
+        self.visual_offset = 0
 
         # Canvas
-        self.canvas = GameCanvas(self.notes, self)
+        self.canvas = GameCanvas(self.engine, self)
         self.setCentralWidget(self.canvas)
 
-        self.player.setSource(QUrl.fromLocalFile(self.map_data["song"]))
-        self.start_time = None
+        self.clock = SongClock(self.player)
+
+        # Entrées : horodatées à la frappe, jugées une fois par frame
+        self.inputs = InputQueue()
+        self.input_timestamps = EventTimestamps()
+        self.input_latency = RingBuffer(240)
 
+        # Boucle de jeu : un seul timer précis, un seul paint par frame
+        self.frame_stats = FrameStats()
+        self.show_frame_stats = False
         self.timer = QTimer()
+        self.timer.setTimerType(Qt.PreciseTimer)
         self.timer.timeout.connect(self.update_game)
-        self.start_game()
+
+        # La première frame attend que la lecture ait réellement commencé
+        self.waiting_start = False
+        self.player.positionChanged.connect(self.on_position_changed)
+        self.start_timeout = QTimer(self)
+        self.start_timeout.setSingleShot(True)
+        self.start_timeout.timeout.connect(self.begin_frames)
+
+        # L'audio a pu être prêt (ou en échec) avant la fin de la construction de l'écran
+        self.ui_ready = True
+        if self.preloader.is_ready or self.preloader.error is not None:
+            self.start_game()
+
+    def on_audio_ready(self):
+        if self.ui_ready:
+            self.start_game()
+
+    def on_audio_failed(self, error):
+        print(f"[Audio] Erreur de chargement : {error}")
+        self.on_audio_ready()
 
     def start_game(self):
-        self.start_time = time.perf_counter()
+        self.waiting_start = True
         self.player.play()
-        self.timer.start(16)
+        self.start_timeout.start(int(SYNC_TIMEOUT * 1000))
+
+    def on_position_changed(self, position):
+        if self.waiting_start and position > 0:
+            self.begin_frames()
+
+    def begin_frames(self):
+        if not self.waiting_start:
+            return
+        self.waiting_start = False
+        self.start_timeout.stop()
+        self.inputs.clear()
+        self.clock.start()
+        self.frame_stats.pause()
+        self.timer.start(FRAME_INTERVAL_MS)
 
     def pause_game(self):
+        if self.waiting_start:
+            return
         if self.paused:
             self.paused = False
+            self.inputs.clear()
             self.player.play()
-            self.timer.start(16)
+            self.clock.resume()
+            self.timer.start(FRAME_INTERVAL_MS)
         else:
             self.paused = True
             self.player.pause()
+            self.clock.pause()
+            self.frame_stats.pause()
             self.timer.stop()
 
     def update_game(self):
         if self.paused:
             return
-        current_time = time.perf_counter() - self.start_time
-        self.canvas.update_time(current_time)
-        self.canvas.repaint()
-        if current_time > max(n["time"] for n in self.notes) + 2 or self.life <= 0:
+        start = time.perf_counter()
+        dt = self.frame_stats.begin_frame(start)
+
+        current_time = self.song_time()
+        self.process_inputs()
+        if self.engine.update(current_time):
+            self.canvas.trigger_feedback("MISS")
+        # La frame sera visible visual_offset plus tard : on dessine en avance d'autant
+        self.canvas.update_time(current_time + self.visual_offset / 1000)
+        self.canvas.animate(dt)
+        self.canvas.update()
+
+        self.frame_stats.record_update(time.perf_counter() - start)
+        if self.engine.finished(current_time):
             self.timer.stop()
             self.player.stop()
             self.show_results()
 
+    def song_time(self):
+        # Position réellement entendue : le lecteur est en avance de la latence de sortie audio
+        return self.clock.time() - self.audio_offset / 1000
+
+    def process_inputs(self):
+        for kind, direction, song_time, event_perf in self.inputs.drain():
+            # Pas de notes longues : les relâchements sont seulement enregistrés
+            if kind != KEY_DOWN:
+                continue
+            if self.engine.update(song_time):
+                self.canvas.trigger_feedback("MISS")
+            judgement = self.engine.press(direction, song_time)
+            self.canvas.trigger_feedback(judgement.upper() if judgement is not None else "MISS")
+            self.input_latency.push(time.perf_counter() - event_perf)
+
+    def push_input(self, kind, event):
+        # Ramène le moment réel de la frappe (timestamp Qt) sur l'horloge de la chanson
+        now = time.perf_counter()
+        event_perf = min(now, self.input_timestamps.to_perf(event.timestamp(), now))
+        song_time = self.song_time() - (now - event_perf)
+        self.inputs.push((kind, KEY_MAPPING[event.key()], song_time, event_perf))
+
     def keyPressEvent(self, event):
+        if event.isAutoRepeat():
+            return
         key = event.key()
         if key == Qt.Key_Escape:
             self.pause_game()
             return
+        if key == Qt.Key_F3:
+            self.show_frame_stats = not self.show_frame_stats
+            return
         if key in KEY_MAPPING and not self.paused:
-            direction = KEY_MAPPING[key]
-            current_time = time.perf_counter() - self.start_time
-            self.canvas.hit_note(direction, current_time)
+            self.push_input(KEY_DOWN, event)
+
+    def keyReleaseEvent(self, event):
+        if event.isAutoRepeat():
+            return
+        if event.key() in KEY_MAPPING and not self.paused:
+            self.push_input(KEY_UP, event)
 
     def show_results(self):
-        total_notes = len(self.notes)
-        hit_notes = sum(1 for n in self.notes if n.get("hit"))
+        total_notes = self.chart.note_count
+        hit_notes = self.chart.hits
         missed_notes = total_notes - hit_notes
         accuracy = (hit_notes / total_notes) * 100 if total_notes else 0
 
@@ -139,8 +243,10 @@ class GameWindow(QMainWindow):
         layout.addWidget(make_label(f"🎯 Précision : {accuracy:.1f}%"))
         layout.addWidget(make_label(f"✅ Notes touchées : {hit_notes}/{total_notes}"))
         layout.addWidget(make_label(f"❌ Miss : {missed_notes}"))
-        layout.addWidget(make_label(f"💯 Score : {self.score}"))
-        layout.addWidget(make_label(f"🔥 Combo max : {self.max_combo}"))
+        breakdown = "  ".join(f"{name.capitalize()} : {count}" for name, count in self.engine.judgement_counts.items())
+        layout.addWidget(make_label(breakdown))
+        layout.addWidget(make_label(f"💯 Score : {self.engine.score}"))
+        layout.addWidget(make_label(f"🔥 Combo max : {self.engine.max_combo}"))
         layout.addWidget(make_label(f"⏱ Temps de jeu : {minutes} min {seconds:02}s"))
 
         # Boutons
@@ -171,16 +277,11 @@ class GameWindow(QMainWindow):
     def retry_game(self):
         self.player.stop()
         self.timer.stop()
-        for note in self.notes:
-            note.pop("hit", None)  # reset hit status
-        self.score = 0
-        self.combo = 0
-        self.max_combo = 0
-        self.life = MAX_LIFE
-        self.start_time = None
+        self.waiting_start = False
+        self.engine.reset()  # reset hit status, score et vie
 
         # Crée une nouvelle instance canvas avec notes réinitialisées
-        self.canvas = GameCanvas(self.notes, self)
+        self.canvas = GameCanvas(self.engine, self)
         self.setCentralWidget(self.canvas)
 
         self.start_game()
@@ -190,25 +291,23 @@ class GameWindow(QMainWindow):
 
 
 class GameCanvas(QWidget):
-    def __init__(self, notes, parent):
+    # Simple rendu de l'état du GameEngine : aucune logique de jugement ici
+    def __init__(self, engine, parent):
         super().__init__()
-        self.notes = notes
+        self.engine = engine
+        self.chart = engine.chart
         self.parent = parent
         self.current_time = 0.0
 
-        # Effet feedback
+        # Effet feedback (animé par la boucle de jeu, pas de timer dédié)
         self.feedback = ""
         self.feedback_size = 0
         self.feedback_opacity = 0.0
-        self.feedback_timer = QTimer(self)
-        self.feedback_timer.timeout.connect(self.animate_feedback)
 
-        # Equalizer
+        # Equalizer et pulsation, rythmés par la tempo map de la chart
         self.bars = [10] * 20
-        self.bar_timer = QTimer(self)
-        self.bar_timer.setInterval(100)
-        self.bar_timer.timeout.connect(self.update_bars)
-        self.bar_timer.start()
+        self.bar_tick = None
+        self.beat_pulse = 0.0
 
         # Sprites
         self.sprites = {
@@ -216,97 +315,148 @@ class GameCanvas(QWidget):
             for d in ["left", "down", "up", "right"]
         }
 
+        # Cache de rendu : reconstruit au resize et au changement de thème
+        self.static_layer = None
+        self.scaled_sprites = {}
+        self.fonts = {}
+        self.texts = {}
+
+    def invalidate_cache(self):
+        self.static_layer = None
+        self.scaled_sprites = {}
+        self.fonts = {}
+        self.texts = {}
+
+    def resizeEvent(self, event):
+        self.invalidate_cache()
+        super().resizeEvent(event)
+
+    def changeEvent(self, event):
+        if event.type() in (QEvent.StyleChange, QEvent.PaletteChange, QEvent.FontChange):
+            self.invalidate_cache()
+        super().changeEvent(event)
+
+    def build_cache(self):
+        ratio = self.devicePixelRatioF()
+
+        # Fond, ligne cible et cadre de la barre de vie : dessinés une fois par taille
+        self.static_layer = QPixmap(int(self.width() * ratio), int(self.height() * ratio))
+        self.static_layer.setDevicePixelRatio(ratio)
+        painter = QPainter(self.static_layer)
+        painter.fillRect(self.rect(), QColor("#111"))
+        painter.setPen(QColor("white"))
+        painter.drawLine(0, TARGET_Y, self.width(), TARGET_Y)
+        painter.setPen(QColor("#00e676"))
+        painter.drawRect(20, 90, self.width() - 40, 10)
+        painter.end()
+
+        # Flèches redimensionnées à leur taille d'affichage : le dessin devient une simple copie
+        for d, sprite in self.sprites.items():
+            scaled = sprite.scaled(int(NOTE_SIZE * ratio), int(NOTE_SIZE * ratio),
+                                   Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+            scaled.setDevicePixelRatio(ratio)
+            self.scaled_sprites[d] = scaled
+
+    def get_font(self, size):
+        if size not in self.fonts:
+            self.fonts[size] = QFont(self.font().family(), size, QFont.Bold)
+        return self.fonts[size]
+
+    def get_text(self, slot, text):
+        # Un QStaticText par emplacement du HUD, recréé seulement quand le texte change
+        cached = self.texts.get(slot)
+        if cached is None or cached.text() != text:
+            cached = QStaticText(text)
+            cached.setTextFormat(Qt.PlainText)
+            self.texts[slot] = cached
+        return cached
+
     def update_time(self, t):
         self.current_time = t
 
-    def hit_note(self, direction, current_time):
-        for note in self.notes:
-            if note.get("hit"):
-                continue
-            if note["direction"] == direction and abs(note["time"] - current_time) < HIT_WINDOW:
-                note["hit"] = True
-                self.trigger_feedback(direction.upper())
-                self.parent.score += 100 + self.parent.combo * 10
-                self.parent.combo += 1
-                self.parent.max_combo = max(self.parent.max_combo, self.parent.combo)
-                self.parent.life = min(MAX_LIFE, self.parent.life + LIFE_GAIN)
-                return
-        self.trigger_feedback("MISS")
-        self.parent.combo = 0
-        self.parent.life -= LIFE_LOSS
-
     def trigger_feedback(self, text):
         self.feedback = text
         self.feedback_size = 48
         self.feedback_opacity = 1.0
-        self.feedback_timer.start(30)
 
-    def animate_feedback(self):
-        self.feedback_size -= 2
-        self.feedback_opacity -= 0.05
-        if self.feedback_opacity <= 0:
-            self.feedback_timer.stop()
-        self.update()
-
-    def update_bars(self):
-        self.bars = [random.randint(5, 60) for _ in self.bars]
-        self.update()
+    def animate(self, dt):
+        # Animations basées sur le temps écoulé depuis la frame précédente
+        if self.feedback_opacity > 0:
+            steps = dt / FEEDBACK_STEP
+            self.feedback_size -= 2 * steps
+            self.feedback_opacity -= 0.05 * steps
+
+        self.beat_pulse = max(0.0, self.beat_pulse - BEAT_PULSE_DECAY * dt)
+        tick = math.floor(self.chart.tempo.beat_at(self.current_time) * BAR_DIVISION)
+        if tick != self.bar_tick:
+            if self.bar_tick is not None and tick % BAR_DIVISION == 0:
+                self.beat_pulse = 1.0
+            self.bar_tick = tick
+            self.bars = [random.randint(5, 60) for _ in self.bars]
 
     def paintEvent(self, event):
+        start = time.perf_counter()
+        if self.static_layer is None:
+            self.build_cache()
         painter = QPainter(self)
-        painter.fillRect(self.rect(), QColor("#111"))
-        painter.setPen(QColor("white"))
-        painter.drawLine(0, TARGET_Y, self.width(), TARGET_Y)
-
-        # Notes
-        for note in self.notes:
-            y = TARGET_Y - ((note["time"] - self.current_time) * NOTE_SPEED)
+        painter.drawPixmap(0, 0, self.static_layer)
 
-            # Vérifie si la note est trop basse et non touchée -> MISS
-            if not note.get("hit") and y > TARGET_Y + 50:
-                note["hit"] = True
-                self.trigger_feedback("MISS")
-                self.parent.combo = 0
-                self.parent.life -= LIFE_LOSS
-                continue
+        # Pulsation de la ligne cible sur le beat
+        if self.beat_pulse > 0:
+            painter.fillRect(0, TARGET_Y - 2, self.width(), 5, QColor(0, 230, 118, int(self.beat_pulse * 200)))
 
-            if note.get("hit"):
+        # Notes : seules celles entre la limite de miss et le haut de l'écran sont parcourues
+        end = bisect_right(self.chart.times, self.current_time + (TARGET_Y + 40) / NOTE_SPEED)
+        for i in range(self.engine.miss_cursor, end):
+            if self.chart.state[i]:
                 continue
+            y = TARGET_Y - ((self.chart.times[i] - self.current_time) * NOTE_SPEED)
 
             if y > self.height():
                 continue
 
-            x = NOTE_X_POS[note["direction"]]
-            painter.drawPixmap(int(x), int(y), 40, 40, self.sprites[note["direction"]])
+            direction = self.chart.direction(i)
+            x = NOTE_X_POS[direction]
+            painter.drawPixmap(int(x), int(y), self.scaled_sprites[direction])
 
-        # Score & combo
+        # Score & combo (QStaticText : position = coin haut-gauche, pas ligne de base)
         painter.setPen(QColor("#00e676"))
-        font = QFont(self.font().family(), 14, QFont.Bold)
-        painter.setFont(font)
-        painter.drawText(20, 40, f"Score: {self.parent.score}")
-        painter.drawText(20, 70, f"Combo: {self.parent.combo}")
+        painter.setFont(self.get_font(14))
+        ascent = painter.fontMetrics().ascent()
+        painter.drawStaticText(20, 40 - ascent, self.get_text("score", f"Score: {self.engine.score}"))
+        painter.drawStaticText(20, 70 - ascent, self.get_text("combo", f"Combo: {self.engine.combo}"))
 
-        # Life bar
-        life_w = int((self.parent.life / MAX_LIFE) * (self.width() - 40))
+        # Life bar (le cadre fait partie du calque statique)
+        life_w = int((self.engine.life / MAX_LIFE) * (self.width() - 40))
         painter.setBrush(QColor("#4caf50"))
         painter.drawRect(20, 90, life_w, 10)
-        painter.setBrush(Qt.NoBrush)
-        painter.drawRect(20, 90, self.width() - 40, 10)
 
         # BPM & time
-        bpm = self.parent.map_data.get("bpm", 120)
-        painter.drawText(350, 40, f"BPM: {bpm}")
+        painter.drawStaticText(350, 40 - ascent, self.get_text("bpm", f"BPM: {self.chart.tempo.bpm_at(self.current_time):g}"))
         painter.drawText(350, 70, f"Temps: {self.current_time:.2f}s")
 
         # Feedback
         if self.feedback_opacity > 0:
             painter.setPen(QColor(255, 255, 255, int(self.feedback_opacity * 255)))
-            font.setPointSize(self.feedback_size)
-            painter.setFont(font)
+            painter.setFont(self.get_font(max(1, int(self.feedback_size))))
             w = painter.fontMetrics().horizontalAdvance(self.feedback)
             painter.drawText((self.width() - w)//2, TARGET_Y - 100, self.feedback)
 
         # Equalizer bars
         for i, h in enumerate(self.bars):
             painter.setBrush(QColor("#00e676"))
-            painter.drawRect(20 + i * 25, self.height() - h - 10, 15, h)
\ No newline at end of file
+            painter.drawRect(20 + i * 25, self.height() - h - 10, 15, h)
+
+        # Overlay de performance (F3)
+        if self.parent.show_frame_stats:
+            stats = self.parent.frame_stats.summary()
+            painter.setPen(QColor("white"))
+            painter.setFont(self.get_font(10))
+            painter.drawText(self.width() - 260, 30, f"FPS: {stats['fps']:.0f}  perdues: {stats['dropped']}")
+            painter.drawText(self.width() - 260, 50, f"Frame p50/p99: {stats['p50']:.1f} / {stats['p99']:.1f} ms")
+            painter.drawText(self.width() - 260, 70, f"Update/Paint p99: {stats['update_p99']:.2f} / {stats['paint_p99']:.2f} ms")
+            latency = self.parent.input_latency
+            painter.drawText(self.width() - 260, 90, f"Latence entrée p50/p99: {latency.percentile(50) * 1000:.1f} / {latency.percentile(99) * 1000:.1f} ms")
+
+        painter.end()
+        self.parent.frame_stats.record_paint(time.perf_counter() - start)
\ No newline at end of file
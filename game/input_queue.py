@@ -0,0 +1,46 @@
+KEY_DOWN = 0
+KEY_UP = 1
+
+
+class InputQueue:
+    # Tampon circulaire un producteur / un consommateur : l'écriture ne touche que head,
+    # la lecture que tail, aucun verrou n'est nécessaire
+    def __init__(self, size=256):
+        self.buffer = [None] * size
+        self.head = 0
+        self.tail = 0
+        self.overflows = 0
+
+    def push(self, event):
+        next_head = (self.head + 1) % len(self.buffer)
+        if next_head == self.tail:
+            self.overflows += 1
+            return False
+        self.buffer[self.head] = event
+        self.head = next_head
+        return True
+
+    def drain(self):
+        while self.tail != self.head:
+            event = self.buffer[self.tail]
+            self.buffer[self.tail] = None
+            self.tail = (self.tail + 1) % len(self.buffer)
+            yield event
+
+    def clear(self):
+        for _ in self.drain():
+            pass
+
+
+class EventTimestamps:
+    # Convertit les timestamps Qt (ms, origine arbitraire) vers perf_counter.
+    # Le décalage retenu est le plus petit observé : l'événement le plus rapide
+    # à être traité sert de référence "sans délai".
+    def __init__(self):
+        self.offset = None
+
+    def to_perf(self, timestamp_ms, now):
+        candidate = now - timestamp_ms / 1000
+        if self.offset is None or candidate < self.offset:
+            self.offset = candidate
+        return timestamp_ms / 1000 + self.offset
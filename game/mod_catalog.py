@@ -0,0 +1,90 @@
+import json
+import os
+import zipfile
+
+from .song_loader import load_chart_bytes
+
+# Métadonnées des mods .zip persistées entre les lancements, indexées par chemin
+# et invalidées quand la taille ou la date de modification du zip change
+CATALOG_PATH = os.path.join(os.path.dirname(__file__), "..", ".cache", "mods.json")
+CHART_EXTS = (".pyfnf", ".pyfnfb")
+AUDIO_EXTS = (".mp3",)
+
+
+def scan_mod(path):
+    stat = os.stat(path)
+    entry = {
+        "name": os.path.splitext(os.path.basename(path))[0],
+        "mtime": stat.st_mtime,
+        "size": stat.st_size,
+        "chart": None,
+        "audio": None,
+        "valid": False,
+    }
+    try:
+        with zipfile.ZipFile(path, "r") as zip_ref:
+            names = zip_ref.namelist()
+            entry["chart"] = next((n for n in names if n.endswith(CHART_EXTS)), None)
+            entry["audio"] = next((n for n in names if n.endswith(AUDIO_EXTS)), None)
+            if entry["chart"] and entry["audio"]:
+                chart = load_chart_bytes(zip_ref.read(entry["chart"]))
+                entry["duration"] = chart.duration
+                entry["note_count"] = chart.note_count
+                entry["valid"] = True
+    except (OSError, zipfile.BadZipFile, ValueError) as e:
+        entry["error"] = str(e)
+    except Exception as e:
+        # Contenu inattendu dans le zip : le mod est invalide, l'analyse des autres continue
+        entry["error"] = f"Erreur inattendue : {e}"
+    return entry
+
+
+class ModCatalog:
+    def __init__(self, path=CATALOG_PATH):
+        self.path = path
+        self.entries = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def is_fresh(self, mod_path):
+        entry = self.entries.get(mod_path)
+        if entry is None:
+            return False
+        try:
+            stat = os.stat(mod_path)
+        except OSError:
+            return False
+        return entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size
+
+    def scan_dir(self, mods_dir):
+        # Retourne (entrées à jour, chemins à rescanner) ; les zips disparus sont oubliés
+        paths = [
+            os.path.join(mods_dir, f) for f in sorted(os.listdir(mods_dir)) if f.endswith(".zip")
+        ]
+        for gone in set(self.entries) - set(paths):
+            if os.path.dirname(gone) == mods_dir:
+                del self.entries[gone]
+
+        fresh, stale = [], []
+        for path in paths:
+            if self.is_fresh(path):
+                fresh.append((path, self.entries[path]))
+            else:
+                stale.append(path)
+        return fresh, stale
+
+    def get(self, mod_path):
+        return self.entries.get(mod_path)
+
+    def update(self, mod_path, entry):
+        self.entries[mod_path] = entry
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(tmp, self.path)
@@ -0,0 +1,193 @@
+import json
+import os
+import shutil
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from .chart import LANES
+from .chart_format import loads_chart
+from .mod_catalog import ModCatalog, CHART_EXTS, AUDIO_EXTS
+from .song_loader import cache_key, load_chart_bytes
+
+MODS_DIR = os.path.join(os.path.dirname(__file__), "..", "mods")
+AUDIO_PROBE_BYTES = 256 * 1024
+# Deux notes plus proches que ça sur la même direction sont injouables
+MIN_NOTE_GAP = 0.02
+
+# MPEG audio : bitrates (kbps) et fréquences selon version/layer
+MP3_BITRATES = {
+    (3, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (3, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (3, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+def mp3_frame_length(data, pos):
+    # Longueur de la trame MPEG commençant à pos, ou None si l'en-tête est invalide
+    if pos + 4 > len(data) or data[pos] != 0xFF or data[pos + 1] & 0xE0 != 0xE0:
+        return None
+    version = (data[pos + 1] >> 3) & 0x03
+    layer = 4 - ((data[pos + 1] >> 1) & 0x03)
+    bitrate_index = data[pos + 2] >> 4
+    rate_index = (data[pos + 2] >> 2) & 0x03
+    padding = (data[pos + 2] >> 1) & 0x01
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrate = MP3_BITRATES[(3 if version == 3 else 2, layer)][bitrate_index] * 1000
+    rate = MP3_SAMPLE_RATES[version][rate_index]
+    if layer == 1:
+        return (12 * bitrate // rate + padding) * 4
+    if layer == 3 and version != 3:
+        return 72 * bitrate // rate + padding
+    return 144 * bitrate // rate + padding
+
+
+def check_audio(data):
+    # Saute le tag ID3v2 puis exige deux trames MPEG consécutives valides
+    pos = 0
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        pos = 10 + size
+    end = min(len(data) - 4, pos + 64 * 1024)
+    while pos < end:
+        length = mp3_frame_length(data, pos)
+        if length and mp3_frame_length(data, pos + length) is not None:
+            return None
+        pos += 1
+    return "Audio illisible : aucune trame MP3 valide"
+
+
+def lint_chart(store):
+    warnings = []
+    if not len(store):
+        warnings.append("Chart vide")
+        return warnings
+    if any(a > b for a, b in zip(store.times, store.times[1:])):
+        warnings.append("Notes non triées")
+    pairs = list(zip(store.times, store.lanes))
+    if len(set(pairs)) != len(pairs):
+        warnings.append(f"{len(pairs) - len(set(pairs))} note(s) en double")
+
+    last = {}
+    close = 0
+    for t, lane in sorted(set(pairs)):
+        if lane in last and t - last[lane] < MIN_NOTE_GAP:
+            close += 1
+        last[lane] = t
+    if close:
+        warnings.append(f"{close} note(s) à moins de {int(MIN_NOTE_GAP * 1000)} ms d'une autre sur la même direction")
+    return warnings
+
+
+def validate_mod(path):
+    # Exécuté dans un process du pool : aucune écriture hors du cache de charts
+    report = {"archive": path, "ok": False, "errors": [], "warnings": []}
+    try:
+        with zipfile.ZipFile(path, "r") as zip_ref:
+            names = zip_ref.namelist()
+            unsafe = [n for n in names if n.startswith(("/", "\\")) or ".." in n.replace("\\", "/").split("/")]
+            if unsafe:
+                report["errors"].append(f"Chemins dangereux : {', '.join(unsafe)}")
+            charts = [n for n in names if n.endswith(CHART_EXTS)]
+            audios = [n for n in names if n.endswith(AUDIO_EXTS)]
+            if not charts:
+                report["errors"].append("Aucun fichier .pyfnf")
+            if not audios:
+                report["errors"].append("Aucun fichier .mp3")
+            if len(charts) > 1:
+                report["warnings"].append(f"Plusieurs charts, seule {charts[0]} est utilisée")
+            if report["errors"]:
+                return report
+
+            raw = zip_ref.read(charts[0])
+            report["chart_hash"] = cache_key(raw)
+            data = loads_chart(raw)
+            if not isinstance(data.get("bpm", 120), (int, float)):
+                report["warnings"].append("BPM invalide")
+            if any(lane >= len(LANES) for lane in data["notes"].lanes):
+                raise ValueError("Direction invalide")
+            report["warnings"].extend(lint_chart(data["notes"]))
+            chart = load_chart_bytes(raw)
+
+            with zip_ref.open(audios[0]) as f:
+                error = check_audio(f.read(AUDIO_PROBE_BYTES))
+            if error:
+                report["errors"].append(error)
+                return report
+
+        report["entry"] = {
+            "name": os.path.splitext(os.path.basename(path))[0],
+            "chart": charts[0],
+            "audio": audios[0],
+            "duration": chart.duration,
+            "note_count": chart.note_count,
+            "valid": True,
+        }
+        report["ok"] = True
+    except (OSError, zipfile.BadZipFile, ValueError) as e:
+        report["errors"].append(str(e))
+    except Exception as e:
+        # Une archive mal formée ne doit jamais interrompre l'import des autres
+        report["errors"].append(f"Erreur inattendue : {e}")
+    return report
+
+
+def register_mod(report, mods_dir, catalog):
+    # Copie l'archive validée dans mods/ et l'ajoute au catalogue
+    # L'entrée du catalogue est interne : elle ne reste jamais dans le rapport
+    entry = report.pop("entry")
+    src = report["archive"]
+    dest = os.path.join(mods_dir, os.path.basename(src))
+    if os.path.exists(dest) and not os.path.samefile(src, dest):
+        report["ok"] = False
+        report["errors"].append("Un mod du même nom est déjà installé, import ignoré")
+        return
+    if not os.path.exists(dest):
+        shutil.copy2(src, dest)
+    stat = os.stat(dest)
+    catalog.update(dest, dict(entry, mtime=stat.st_mtime, size=stat.st_size))
+    report["installed"] = dest
+
+
+def import_mods(paths, mods_dir=MODS_DIR, catalog=None, workers=None):
+    catalog = catalog or ModCatalog()
+    mods_dir = os.path.abspath(mods_dir)
+    os.makedirs(mods_dir, exist_ok=True)
+
+    reports = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Un future par archive : l'échec d'un worker (process tué...) n'atteint que son rapport
+        futures = [pool.submit(validate_mod, path) for path in paths]
+        for path, future in zip(paths, futures):
+            try:
+                report = future.result()
+            except Exception as e:
+                report = {"archive": path, "ok": False, "errors": [f"Erreur inattendue : {e}"], "warnings": []}
+            if report["ok"]:
+                try:
+                    register_mod(report, mods_dir, catalog)
+                except OSError as e:
+                    report["ok"] = False
+                    report["errors"].append(f"Installation impossible : {e}")
+            reports.append(report)
+    catalog.save()
+    return reports
+
+
+if __name__ == "__main__":
+    # python -m game.mod_importer dossier_de_zips [rapport.json]
+    folder = sys.argv[1]
+    paths = [os.path.abspath(os.path.join(folder, f)) for f in sorted(os.listdir(folder)) if f.endswith(".zip")]
+    reports = import_mods(paths)
+    output = json.dumps(reports, indent=2)
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    print(f"{sum(r['ok'] for r in reports)}/{len(reports)} mods importés", file=sys.stderr)
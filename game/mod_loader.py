@@ -0,0 +1,45 @@
+import os
+import threading
+import zipfile
+
+from .disk_cache import evict_lru, touch
+from .mod_catalog import scan_mod
+from .song_loader import load_chart_bytes
+
+# Audio des mods extrait une seule fois, indexé par CRC + taille de l'entrée du zip
+AUDIO_CACHE_DIR = os.path.join(os.path.dirname(__file__), "..", ".cache", "audio")
+AUDIO_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+
+def extract_audio(zip_ref, name):
+    info = zip_ref.getinfo(name)
+    ext = os.path.splitext(name)[1]
+    cached = os.path.abspath(os.path.join(AUDIO_CACHE_DIR, f"{info.CRC:08x}-{info.file_size}{ext}"))
+    if os.path.exists(cached):
+        touch(cached)
+        return cached
+
+    os.makedirs(AUDIO_CACHE_DIR, exist_ok=True)
+    tmp = f"{cached}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with zip_ref.open(info) as src, open(tmp, "wb") as dst:
+        while chunk := src.read(1024 * 1024):
+            dst.write(chunk)
+    os.replace(tmp, cached)
+    evict_lru(AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_BYTES)
+    return cached
+
+
+def load_mod(mod_path, entry=None):
+    # Chart lue directement dans le zip (en mémoire), audio servi depuis le cache.
+    # Retourne (chart, chemin de l'audio)
+    if entry is None:
+        entry = scan_mod(mod_path)
+    if not entry.get("chart") or not entry.get("audio"):
+        raise ValueError("Fichiers .pyfnf ou .mp3 manquants.")
+    try:
+        with zipfile.ZipFile(mod_path, "r") as zip_ref:
+            chart = load_chart_bytes(zip_ref.read(entry["chart"]))
+            audio_path = extract_audio(zip_ref, entry["audio"])
+    except (KeyError, zipfile.BadZipFile) as e:
+        raise ValueError(str(e))
+    return chart, audio_path
@@ -0,0 +1,73 @@
+import time
+
+# Correction de dérive : fraction de l'écart appliquée à chaque mise à jour du lecteur,
+# au-delà de SNAP_THRESHOLD on se recale directement
+DRIFT_GAIN = 0.1
+SNAP_THRESHOLD = 0.1
+# Si le lecteur ne démarre jamais (fichier illisible...), on part sur l'horloge locale
+SYNC_TIMEOUT = 1.0
+
+
+class SongClock:
+    # Position dans la chanson basée sur QMediaPlayer.position(), interpolée entre ses mises
+    # à jour (grossières) avec perf_counter et recalée progressivement sur l'audio
+    def __init__(self, player):
+        self.player = player
+        self.running = False
+        self.synced = False
+        self.anchor_pos = 0.0
+        self.anchor_perf = time.perf_counter()
+        self.wait_pos = 0
+        self.last_player_pos = 0
+        self.last_time = 0.0
+
+    def start(self):
+        self.anchor_pos = 0.0
+        self.last_time = 0.0
+        self.resume()
+
+    def pause(self):
+        self.anchor_pos = self.time()
+        self.running = False
+
+    def resume(self):
+        # L'horloge reste figée tant que le lecteur n'a pas réellement repris la sortie audio
+        self.running = True
+        self.synced = False
+        self.wait_pos = self.player.position()
+        self.anchor_perf = time.perf_counter()
+
+    def time(self):
+        if not self.running:
+            return self.anchor_pos
+        now = time.perf_counter()
+        self.sync(now)
+        if not self.synced:
+            return self.anchor_pos
+        t = max(self.anchor_pos + (now - self.anchor_perf), self.last_time)
+        self.last_time = t
+        return t
+
+    def sync(self, now):
+        pos = self.player.position()
+        if not self.synced:
+            if pos != self.wait_pos:
+                self.anchor_pos = pos / 1000
+                self.anchor_perf = now
+                self.last_player_pos = pos
+                self.synced = True
+            elif now - self.anchor_perf > SYNC_TIMEOUT:
+                self.anchor_perf = now
+                self.last_player_pos = pos
+                self.synced = True
+            return
+
+        # On ne compare qu'au moment où le lecteur publie une nouvelle position
+        if pos == self.last_player_pos:
+            return
+        self.last_player_pos = pos
+        drift = pos / 1000 - (self.anchor_pos + (now - self.anchor_perf))
+        if abs(drift) > SNAP_THRESHOLD:
+            self.anchor_pos += drift
+        else:
+            self.anchor_pos += drift * DRIFT_GAIN
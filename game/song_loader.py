@@ -1,5 +1,94 @@
-import json
+import hashlib
+import math
+import os
+from array import array
+
+from .chart import Chart, NoteStore, LANES
+from .chart_format import VERSION, encode_binary, loads_chart, read_chart
+from .disk_cache import atomic_write, evict_lru, touch
+
+# Cache des charts compilées (validées, triées, dédoublonnées) au format binaire,
+# indexé par le hash du fichier source et la version du format
+CACHE_DIR = os.path.join(os.path.dirname(__file__), "..", ".cache", "charts")
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+COMPILER_VERSION = 2
+
+
+def compile_chart(data):
+    store = data["notes"]
+    for i, (t, lane) in enumerate(zip(store.times, store.lanes)):
+        if not math.isfinite(t) or t < 0:
+            raise ValueError(f"Note {i} : temps invalide ({t})")
+        if lane >= len(LANES):
+            raise ValueError(f"Note {i} : direction invalide ({lane})")
+
+    # Déjà trié sans doublon (cas des maps sauvées par l'éditeur, accords compris) : rien à refaire
+    if is_compiled(store):
+        return data
+
+    # Tri par temps puis direction, doublons exacts supprimés (le premier est gardé).
+    # Les identifiants et les champs en plus suivent leurs notes.
+    order = sorted(range(len(store)), key=lambda i: (store.times[i], store.lanes[i]))
+    kept = []
+    for i in order:
+        if kept and store.times[kept[-1]] == store.times[i] and store.lanes[kept[-1]] == store.lanes[i]:
+            continue
+        kept.append(i)
+    notes = NoteStore((store.times[i] for i in kept), (store.lanes[i] for i in kept))
+    notes.ids = array("I", (store.ids[i] for i in kept))
+    notes.next_id = store.next_id
+    notes.extras = {note_id: store.extras[note_id] for note_id in notes.ids if note_id in store.extras}
+    data["notes"] = notes
+    return data
+
+
+def is_compiled(store):
+    # Une seule passe : temps croissants au sens large, et pas deux notes au même temps
+    # sur la même direction
+    previous = None
+    lanes = set()
+    for t, lane in zip(store.times, store.lanes):
+        if previous is not None and t < previous:
+            return False
+        if t != previous:
+            lanes.clear()
+        elif lane in lanes:
+            return False
+        lanes.add(lane)
+        previous = t
+    return True
+
+
+def cache_key(raw):
+    digest = hashlib.blake2b(raw, digest_size=20)
+    digest.update(f"{VERSION}:{COMPILER_VERSION}".encode())
+    return digest.hexdigest()
+
+
+def load_chart_bytes(raw):
+    key = cache_key(raw)
+    cached = os.path.join(CACHE_DIR, key + ".pyfnfb")
+    if os.path.exists(cached):
+        try:
+            data = read_chart(cached)
+            touch(cached)
+            return Chart(data)
+        except (OSError, ValueError):
+            pass
+
+    # La Chart (tempo compris) est construite avant l'écriture : une chart invalide n'est
+    # jamais mise en cache
+    data = compile_chart(loads_chart(raw))
+    chart = Chart(data)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        atomic_write(cached, encode_binary(data))
+        evict_lru(CACHE_DIR, CACHE_MAX_BYTES)
+    except OSError as e:
+        print(f"[ChartCache] Erreur d'écriture : {e}")
+    return chart
+
 
 def load_song_notes(path):
-    with open(path, "r") as f:
-        return json.load(f)
+    with open(path, "rb") as f:
+        return load_chart_bytes(f.read())
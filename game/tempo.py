@@ -0,0 +1,86 @@
+import math
+from array import array
+from bisect import bisect_right
+
+DEFAULT_BPM = 120
+
+
+class TempoMap:
+    # Segments de tempo (début en secondes, bpm) triés par début. Le début du premier segment
+    # est l'offset : le temps 0 de la chanson tombe là. Les numéros de temps (beats) au début
+    # de chaque segment sont des sommes cumulées, la conversion est donc un simple bisect.
+    def __init__(self, segments=((0.0, DEFAULT_BPM),)):
+        segments = sorted((float(start), float(bpm)) for start, bpm in segments)
+        # NaN et infini passent float() (et json) mais cassent tous les calculs de beat
+        if not segments or any(not math.isfinite(start) or not math.isfinite(bpm) or bpm <= 0 for start, bpm in segments):
+            raise ValueError("Tempo invalide")
+        self.starts = array("d", (start for start, _ in segments))
+        self.bpms = array("d", (bpm for _, bpm in segments))
+        self.beat_starts = array("d", [0.0])
+        for i in range(1, len(segments)):
+            span = self.starts[i] - self.starts[i - 1]
+            self.beat_starts.append(self.beat_starts[-1] + span * self.bpms[i - 1] / 60)
+
+    @classmethod
+    def from_data(cls, data):
+        # "tempo" : [{"time": s, "bpm": b}, ...] ; sinon le champ bpm historique, offset 0
+        tempo = data.get("tempo")
+        if not tempo:
+            # Les vieilles charts ont parfois un bpm nul, absent ou pas un nombre : tempo par défaut
+            bpm = data.get("bpm", DEFAULT_BPM)
+            if isinstance(bpm, bool) or not isinstance(bpm, (int, float)) or not 0 < bpm < math.inf:
+                bpm = DEFAULT_BPM
+            return cls(((0.0, bpm),))
+        try:
+            return cls((segment["time"], segment["bpm"]) for segment in tempo)
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Tempo invalide : {e}")
+
+    def to_data(self):
+        return [{"time": start, "bpm": bpm} for start, bpm in zip(self.starts, self.bpms)]
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def offset(self):
+        return self.starts[0]
+
+    def segment_at(self, t):
+        # Avant le premier segment, son tempo est prolongé vers l'arrière
+        return max(0, bisect_right(self.starts, t) - 1)
+
+    def bpm_at(self, t):
+        return self.bpms[self.segment_at(t)]
+
+    def beat_at(self, t):
+        i = self.segment_at(t)
+        return self.beat_starts[i] + (t - self.starts[i]) * self.bpms[i] / 60
+
+    def time_at(self, beat):
+        i = max(0, bisect_right(self.beat_starts, beat) - 1)
+        return self.starts[i] + (beat - self.beat_starts[i]) * 60 / self.bpms[i]
+
+    def grid(self, start, end, division=1):
+        # Lignes de grille (temps, début de beat ?) tous les 1/division de beat sur [start, end]
+        first = math.ceil(self.beat_at(start) * division)
+        last = math.floor(self.beat_at(end) * division)
+        return [(self.time_at(tick / division), tick % division == 0) for tick in range(first, last + 1)]
+
+    def quantize(self, times, division):
+        # Aligne des temps triés sur la grille 1/division en une seule passe : les curseurs de
+        # segment n'avancent jamais, pas de recherche par note. L'ordre des notes est conservé.
+        snapped = array("d")
+        starts, bpms, beat_starts = self.starts, self.bpms, self.beat_starts
+        last = len(starts) - 1
+        seg = 0
+        out_seg = 0
+        for t in times:
+            while seg < last and starts[seg + 1] <= t:
+                seg += 1
+            beat = beat_starts[seg] + (t - starts[seg]) * bpms[seg] / 60
+            beat = round(beat * division) / division
+            while out_seg < last and beat_starts[out_seg + 1] <= beat:
+                out_seg += 1
+            snapped.append(max(0.0, starts[out_seg] + (beat - beat_starts[out_seg]) * 60 / bpms[out_seg]))
+        return snapped
@@ -1,7 +1,7 @@
 import json
+import multiprocessing
 import os
-import zipfile
-import shutil
+from concurrent.futures import ThreadPoolExecutor
 
 from PySide6.QtWidgets import (
     QWidget, QPushButton, QLabel, QVBoxLayout, QHBoxLayout, QApplication,
@@ -14,6 +14,9 @@ from PySide6.QtCore import QUrl
 from editor.editor_main import EditorWindow
 import sys
 from game.game_main import GameWindow
+from game.mod_catalog import ModCatalog, scan_mod
+from game.mod_loader import load_mod
+from game.calibration import CalibrationWindow
 from PySide6.QtGui import QMovie
 from PySide6.QtCore import QObject
 from PySide6.QtCore import QPropertyAnimation, QRect
@@ -25,17 +28,20 @@ import winreg
 
 rpc = None
 
-app = QApplication([])
 
-font_path = os.path.join("data", "assets", "Quicksand-Bold.ttf")
-font_id = QFontDatabase.addApplicationFont(font_path)
-if font_id == -1:
-    print("Erreur : la police n'a pas pu être chargée")
-else:
-    families = QFontDatabase.applicationFontFamilies(font_id)
-    if families:
-        font_family = families[0]
-        app.setFont(QFont(font_family))
+def create_app():
+    # Pas d'application ni de police à l'import : les process de l'auto-charter (spawn)
+    # réimportent ce module et ne doivent pas construire d'interface
+    app = QApplication([])
+    font_path = os.path.join("data", "assets", "Quicksand-Bold.ttf")
+    font_id = QFontDatabase.addApplicationFont(font_path)
+    if font_id == -1:
+        print("Erreur : la police n'a pas pu être chargée")
+    else:
+        families = QFontDatabase.applicationFontFamilies(font_id)
+        if families:
+            app.setFont(QFont(families[0]))
+    return app
 
 CONFIG_PATH = "config.json"
 
@@ -252,6 +258,34 @@ class MenuButton(QPushButton):
                 self.sound_effects['click'].play()
         return super().eventFilter(obj, event)
 
+class ModScanner(QObject):
+    # Analyse les zips en arrière-plan ; le résultat revient sur le thread UI via le signal
+    mod_scanned = Signal(str, dict)
+
+    def __init__(self):
+        super().__init__()
+        self.pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 4)
+
+    def submit(self, path):
+        future = self.pool.submit(scan_mod, path)
+        future.add_done_callback(lambda f: self.on_done(path, f))
+
+    def on_done(self, path, future):
+        # Le signal part toujours, sinon le mod resterait "en cours d'analyse" pour toujours
+        try:
+            entry = future.result()
+        except Exception as e:
+            entry = {
+                "name": os.path.splitext(os.path.basename(path))[0],
+                "mtime": None,
+                "size": None,
+                "chart": None,
+                "audio": None,
+                "valid": False,
+                "error": str(e),
+            }
+        self.mod_scanned.emit(path, entry)
+
 class MenuWidget(QWidget):
     def __init__(self):
         super().__init__()
@@ -304,6 +338,7 @@ class OptionsMenu(QWidget):
     notespeed_changed = Signal(int)
     language_changed = Signal(str)
     keybinding_changed = Signal(str, int)  # action, key code
+    offsets_changed = Signal(int, int)  # audio, affichage (ms)
 
     def __init__(self):
         super().__init__()
@@ -449,6 +484,11 @@ class OptionsMenu(QWidget):
             layout.addWidget(btn)
             self.keybind_buttons[key] = btn
 
+        # Calibration audio / affichage
+        self.calibration_btn = MenuButton("Calibration")
+        self.calibration_btn.clicked.connect(self.open_calibration)
+        layout.addWidget(self.calibration_btn, alignment=Qt.AlignCenter)
+
         # Bouton crédits
         self.credits_btn = MenuButton("Crédits")
         self.credits_btn.clicked.connect(lambda: CreditsPopup().exec())
@@ -525,6 +565,19 @@ class OptionsMenu(QWidget):
         save_config(self.config)
         self.language_changed.emit(text)
 
+    def open_calibration(self):
+        self.calibration_window = CalibrationWindow(
+            self.config.get("audio_offset", 0), self.config.get("visual_offset", 0)
+        )
+        self.calibration_window.calibrated.connect(self.handle_offsets)
+        self.calibration_window.show()
+
+    def handle_offsets(self, audio, visual):
+        self.config["audio_offset"] = audio
+        self.config["visual_offset"] = visual
+        save_config(self.config)
+        self.offsets_changed.emit(audio, visual)
+
 class MainMenu(QWidget):
     play_clicked = Signal()
     multiplayer_clicked = Signal()
@@ -616,6 +669,11 @@ class GameMenuWindow(QWidget):
         self.options_menu.theme_changed.connect(lambda t: setattr(self, 'theme', t))
         self.options_menu.language_changed.connect(lambda l: setattr(self, 'language', l))
 
+        self.mods_page = None
+        self.mod_catalog = ModCatalog()
+        self.mod_scanner = ModScanner()
+        self.mod_scanner.mod_scanned.connect(self.on_mod_scanned)
+        self.scanning = set()
         self.main_menu.mods_clicked.connect(self.show_mods)
         self.main_menu.multiplayer_clicked.connect(self.launch_multiplayer)
 
@@ -652,11 +710,15 @@ class GameMenuWindow(QWidget):
         self.stack.setCurrentWidget(new_widget)
 
     def launch_game(self):
-        path, _ = QFileDialog.getOpenFileName(self, "Choisir une map", "", "*.pyfnf")
+        path, _ = QFileDialog.getOpenFileName(self, "Choisir une map", "", "*.pyfnf *.pyfnfb")
         if not path:
             return
+        try:
+            self.game_window = GameWindow(path)
+        except ValueError as e:
+            QMessageBox.critical(self, "Erreur", f"Map invalide : {e}")
+            return
         self.player.stop()  # Arrêter la musique menu
-        self.game_window = GameWindow(path)
         cfg = self.options_menu.config
         for k, v in cfg.items():
             setattr(self.game_window, k, v)
@@ -682,7 +744,13 @@ class GameMenuWindow(QWidget):
 
     def show_mods(self):
         self.animate_transition(self.options_menu)  # Clear page
-        mods_page = QWidget()
+        if self.mods_page is None:
+            self.build_mods_page()
+        self.refresh_mods()
+        self.stack.setCurrentWidget(self.mods_page)
+
+    def build_mods_page(self):
+        self.mods_page = QWidget()
         layout = QVBoxLayout()
 
         title = QLabel("Sélection du Mod")
@@ -691,22 +759,6 @@ class GameMenuWindow(QWidget):
         layout.addWidget(title)
 
         self.mod_combo = QComboBox()
-        mods_dir = os.path.join(os.path.dirname(__file__), "mods")
-        valid_mods = []
-
-        for file in os.listdir(mods_dir):
-            if file.endswith(".zip"):
-                with zipfile.ZipFile(os.path.join(mods_dir, file), 'r') as zip_ref:
-                    names = zip_ref.namelist()
-                    if any(n.endswith(".mp3") for n in names) and any(n.endswith(".pyfnf") for n in names):
-                        valid_mods.append(file)
-
-        if not valid_mods:
-            self.mod_combo.addItem("Aucun mod valide trouvé")
-            self.mod_combo.setEnabled(False)
-        else:
-            self.mod_combo.addItems(valid_mods)
-
         layout.addWidget(self.mod_combo)
 
         btn_start = MenuButton("Lancer le mod")
@@ -717,9 +769,51 @@ class GameMenuWindow(QWidget):
         btn_back.clicked.connect(self.show_main_menu)
         layout.addWidget(btn_back, alignment=Qt.AlignCenter)
 
-        mods_page.setLayout(layout)
-        self.stack.addWidget(mods_page)
-        self.stack.setCurrentWidget(mods_page)
+        self.mods_page.setLayout(layout)
+        self.stack.addWidget(self.mods_page)
+
+    def refresh_mods(self):
+        # Les mods déjà connus s'affichent tout de suite, les zips modifiés sont
+        # rescannés en arrière-plan et ajoutés au fur et à mesure
+        mods_dir = os.path.join(os.path.dirname(__file__), "mods")
+        fresh, stale = self.mod_catalog.scan_dir(mods_dir)
+
+        self.mod_combo.clear()
+        self.mod_combo.setEnabled(False)
+        self.mod_combo.addItem("Aucun mod valide trouvé" if not stale else "Recherche des mods...")
+        for path, entry in fresh:
+            self.add_mod_item(path, entry)
+
+        for path in stale:
+            if path not in self.scanning:
+                self.scanning.add(path)
+                self.mod_scanner.submit(path)
+        if not stale:
+            self.mod_catalog.save()
+
+    def add_mod_item(self, path, entry):
+        if not entry["valid"]:
+            return
+        if not self.mod_combo.isEnabled():
+            self.mod_combo.clear()
+            self.mod_combo.setEnabled(True)
+        self.mod_combo.addItem(os.path.basename(path))
+        duration = int(entry["duration"])
+        self.mod_combo.setItemData(
+            self.mod_combo.count() - 1,
+            f"{entry['name']} — {entry['note_count']} notes, {duration // 60}:{duration % 60:02}",
+            Qt.ToolTipRole
+        )
+
+    def on_mod_scanned(self, path, entry):
+        self.mod_catalog.update(path, entry)
+        if self.mods_page is not None:
+            self.add_mod_item(path, entry)
+        self.scanning.discard(path)
+        if not self.scanning:
+            self.mod_catalog.save()
+            if not self.mod_combo.isEnabled():
+                self.mod_combo.setItemText(0, "Aucun mod valide trouvé")
 
     def launch_selected_mod(self):
         mod_name = self.mod_combo.currentText()
@@ -728,32 +822,19 @@ class GameMenuWindow(QWidget):
 
         mods_dir = os.path.join(os.path.dirname(__file__), "mods")
         mod_path = os.path.join(mods_dir, mod_name)
-        temp_dir = os.path.join(os.path.dirname(__file__), ".temp_mod")
-
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
-        os.makedirs(temp_dir, exist_ok=True)
 
-        with zipfile.ZipFile(mod_path, 'r') as zip_ref:
-            zip_ref.extractall(temp_dir)
-
-        map_path = None
-        music_path = None
-        for f in os.listdir(temp_dir):
-            if f.endswith(".pyfnf"):
-                map_path = os.path.join(temp_dir, f)
-            elif f.endswith(".mp3"):
-                music_path = os.path.join(temp_dir, f)
-
-        if not map_path or not music_path:
-            QMessageBox.critical(self, "Erreur", "Fichiers .pyfnf ou .mp3 manquants.")
+        # Pas d'extraction : chart lue dans le zip, audio réutilisé depuis le cache
+        entry = self.mod_catalog.get(mod_path) if self.mod_catalog.is_fresh(mod_path) else None
+        try:
+            chart, music_path = load_mod(mod_path, entry)
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, "Erreur", str(e))
             return
 
+        self.game_window = GameWindow(chart=chart, song_path=music_path)
         self.player.stop()
-        self.game_window = GameWindow(map_path)
         for k, v in self.options_menu.config.items():
             setattr(self.game_window, k, v)
-        self.game_window.temp_mod_dir = temp_dir
         self.game_window.show()
         self.close()
 
@@ -799,7 +880,7 @@ class MultiplayerLobby(QWidget):
         self.setLayout(layout)
 
     def choose_map(self):
-        path, _ = QFileDialog.getOpenFileName(self, "Choisir une map", "", "*.pyfnf")
+        path, _ = QFileDialog.getOpenFileName(self, "Choisir une map", "", "*.pyfnf *.pyfnfb")
         if path:
             self.map_path = path
             self.label_map.setText(f"Map sélectionnée : {os.path.basename(path)}")
@@ -821,6 +902,9 @@ class MultiplayerLobby(QWidget):
 
 
 if __name__ == "__main__":
+    # Dans le .exe, un process de l'auto-charter relance ce point d'entrée : il s'arrête ici
+    multiprocessing.freeze_support()
+    app = create_app()
     start_rich_presence()
     os.makedirs("mods", exist_ok=True)
     app.setStyleSheet(dark_style)
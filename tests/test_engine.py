@@ -0,0 +1,30 @@
+from game.chart import Chart
+from game.engine import GameEngine, JUDGEMENTS, autoplay_events, simulate
+
+
+def make_chart(*notes):
+    return Chart({"notes": [{"time": t, "direction": d} for t, d in notes]})
+
+
+def test_press_at_window_edge():
+    # Bornes du bisect et test de judge() arrondis différemment : appui dans le vide, pas de crash
+    chart = make_chart((22.672475715293928, "left"))
+    engine = GameEngine(chart)
+    assert engine.press("left", 22.838475715293928) is None
+    assert chart.hits == 0
+    assert sum(engine.judgement_counts.values()) == 0
+
+
+def test_press_judges_closest_note():
+    engine = GameEngine(make_chart((1.0, "left"), (1.1, "left")))
+    assert engine.press("left", 1.08) == "sick"
+    assert engine.press("left", 1.08) == "good"
+    assert engine.press("left", 1.08) is None
+
+
+def test_autoplay_hits_everything():
+    chart = make_chart((0.5, "left"), (0.5, "right"), (1.0, "up"), (1.5, "down"))
+    result = simulate(chart, autoplay_events(chart)).result()
+    assert result["hits"] == 4
+    assert result["misses"] == 0
+    assert result["judgements"][JUDGEMENTS[0][0]] == 4
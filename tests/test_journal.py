@@ -0,0 +1,109 @@
+from editor.file_handler import load_map, save_map
+from editor.journal import EditJournal, recover
+from game.chart import LANES, NoteStore
+
+
+def make_map(times):
+    notes = NoteStore()
+    for i, t in enumerate(times):
+        notes.add(t, LANES[i % len(LANES)])
+    return {"song": "song.mp3", "bpm": 120, "notes": notes}
+
+
+def open_map(journal, path):
+    # Comme EditorWindow.restore_session sans session à récupérer
+    data = load_map(path)
+    journal.start(path, data)
+    return data
+
+
+def add(journal, data, time, direction):
+    # Comme NoteListModel.add
+    note_id = data["notes"].add(time, direction)
+    journal.append({"op": "add", "id": note_id, "time": time, "direction": direction})
+    return note_id
+
+
+def remove(journal, data, time):
+    # Comme NoteListModel.remove, pour la note de l'éditeur à ce temps
+    notes = data["notes"]
+    note_id = notes.ids[notes.times.index(time)]
+    notes.remove(note_id, time)
+    journal.append({"op": "remove", "id": note_id, "time": time})
+
+
+def save(journal, data, path):
+    # Comme EditorWindow.save_map
+    save_map(path, data)
+    journal.discard()
+    journal.start(path, data)
+
+
+def test_recover_after_save(tmp_path):
+    path = str(tmp_path / "map.pyfnf")
+    save_map(path, make_map([1.0, 2.0, 3.0, 4.0]))
+    journal = EditJournal()
+    data = open_map(journal, path)
+
+    add(journal, data, 1.5, LANES[0])
+    save(journal, data, path)
+    remove(journal, data, 2.0)
+    # Crash : ni sauvegarde ni fermeture du journal
+
+    recovered = recover(path)
+    assert recovered is not None
+    times = list(recovered[0]["notes"].times)
+    assert times == [1.0, 1.5, 3.0, 4.0]
+    journal.close()
+
+
+def test_no_recovery_without_changes(tmp_path):
+    path = str(tmp_path / "map.pyfnf")
+    save_map(path, make_map([1.0, 2.0]))
+    journal = EditJournal()
+    data = open_map(journal, path)
+    assert recover(path) is None
+
+    add(journal, data, 3.0, LANES[1])
+    save(journal, data, path)
+    assert recover(path) is None
+    journal.close()
+
+
+def test_no_files_without_changes(tmp_path):
+    path = str(tmp_path / "map.pyfnf")
+    save_map(path, make_map([1.0, 2.0]))
+    journal = EditJournal()
+    data = open_map(journal, path)
+    save(journal, data, path)
+    journal.close()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["map.pyfnf"]
+
+
+def test_first_edit_after_open(tmp_path):
+    path = str(tmp_path / "map.pyfnf")
+    save_map(path, make_map([1.0, 2.0]))
+    journal = EditJournal()
+    data = open_map(journal, path)
+    remove(journal, data, 1.0)
+    add(journal, data, 3.0, LANES[2])
+
+    data, seq = recover(path)
+    assert list(data["notes"].times) == [2.0, 3.0]
+    assert seq == 2
+    journal.close()
+
+
+def test_recovered_session_is_kept_until_saved(tmp_path):
+    path = str(tmp_path / "map.pyfnf")
+    save_map(path, make_map([1.0, 2.0]))
+    journal = EditJournal()
+    data = open_map(journal, path)
+    add(journal, data, 3.0, LANES[1])
+
+    # Reprise de la session : l'état récupéré reste proposé tant qu'il n'est pas sauvegardé
+    data, seq = recover(path)
+    journal.start(path, data, seq, recovered=True)
+    data, seq = recover(path)
+    assert list(data["notes"].times) == [1.0, 2.0, 3.0]
+    journal.close()